@@ -0,0 +1,59 @@
+"""
+Benchmarks for the service hot paths
+
+Each benchmark runs against a throwaway test database created on the
+configured database server, run them from the app directory:
+
+    python -m benchmarks.token_issuance
+"""
+import os
+import time
+
+
+def setup_django():
+    """
+    Configures Django and creates the test database
+    Returns: the name of the original database
+    """
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uservice.settings')
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    return old_name
+
+
+def teardown_django(old_name):
+    from django.db import connection
+    from django.test.utils import teardown_test_environment
+
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    teardown_test_environment()
+
+
+def measure(fn, iterations):
+    """
+    Calls fn `iterations` times
+    Returns: calls per second
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+def report(title, results):
+    """
+    Prints calls per second of each variant, relative to the first one
+    Parameters: title, results  (list of (name, calls per second))
+    """
+    print(title)
+    baseline = results[0][1]
+    for name, rate in results:
+        print(f'  {name:<32} {rate:>12,.0f} ops/s  {rate / baseline:>6.2f}x')
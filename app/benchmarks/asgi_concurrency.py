@@ -0,0 +1,239 @@
+"""
+PUT /api/user/ from more slow clients than gunicorn threads: the WSGI
+handler, where a connection holds a thread while its body arrives,
+against the ASGI handler with sync and with async views
+
+    python -m benchmarks.asgi_concurrency [--requests 1000]
+        [--concurrency 1000] [--threads 100] [--client-latency 1]
+"""
+import argparse
+import asyncio
+import io
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import report, setup_django, teardown_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=1000,
+        help='Open client connections.',
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=100,
+        help='Threads of the WSGI worker, gunicorn --threads.',
+    )
+    parser.add_argument(
+        '--client-latency',
+        type=float,
+        default=1,
+        help='Seconds each client takes to send its request body.',
+    )
+    args = parser.parse_args()
+
+    old_name = setup_django()
+    try:
+        run(
+            args.requests,
+            args.concurrency,
+            args.threads,
+            args.client_latency,
+        )
+    finally:
+        teardown_django(old_name)
+
+
+class SlowInput(io.BytesIO):
+    """
+    wsgi.input of a client that sends its body after a delay
+    """
+
+    def __init__(self, body, latency):
+        super().__init__(body)
+        self.latency = latency
+
+    def read(self, size=-1):
+        if self.latency:
+            time.sleep(self.latency)
+            self.latency = 0
+        return super().read(size)
+
+
+def run(requests, concurrency, threads, latency):
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import override_settings
+    from django.urls import path
+    from rest_framework.authtoken.models import Token
+
+    from connector import async_views, views
+    from connector.models import UserModel
+
+    user = UserModel.objects.create_user(
+        username='bench',
+        email='bench@example.com',
+        first_name='Bench',
+        last_name='Mark',
+        password='Bench-mark-1!',
+    )
+    key = Token.objects.create(user=user).key
+    # An unchanged name, every request runs auth and validation only
+    body = b'{"first_name": "Bench"}'
+
+    def urlconf(interface):
+        # Resolvers are cached per urlconf, it must be hashable
+        class URLConf:
+            urlpatterns = [
+                path(
+                    'api/user/',
+                    interface.UserViewSet.as_view({'put': 'update'}),
+                )
+            ]
+
+        return URLConf
+
+    def wsgi_request(handler):
+        environ = {
+            'REQUEST_METHOD': 'PUT',
+            'PATH_INFO': '/api/user/',
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'HTTP_AUTHORIZATION': f'Token {key}',
+            'wsgi.input': SlowInput(body, latency),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+        }
+        statuses = []
+        response = handler(
+            environ, lambda status, headers: statuses.append(status)
+        )
+        b''.join(response)
+        response.close()
+        return int(statuses[0].split()[0])
+
+    async def asgi_request(handler):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'PUT',
+            'scheme': 'http',
+            'path': '/api/user/',
+            'raw_path': b'/api/user/',
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'authorization', f'Token {key}'.encode()),
+            ],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        messages = [{'type': 'http.request', 'body': body}]
+        statuses = []
+
+        async def receive():
+            if not messages:
+                return {'type': 'http.disconnect'}
+            await asyncio.sleep(latency)
+            return messages.pop()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        await handler(scope, receive, send)
+        return statuses[0]
+
+    def run_wsgi():
+        handler = WSGIHandler()
+        # Connections beyond the threads wait in the listen backlog
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return list(
+                pool.map(lambda _: wsgi_request(handler), range(requests))
+            )
+
+    def run_asgi():
+        handler = ASGIHandler()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def bounded():
+            async with slots:
+                return await asgi_request(handler)
+
+        async def gather():
+            return await asyncio.gather(*(bounded() for _ in range(requests)))
+
+        return asyncio.run(gather())
+
+    def check(statuses):
+        failed = sum(status != 201 for status in statuses)
+        if failed:
+            raise RuntimeError(f'{failed} of {requests} requests failed')
+
+    def measure_run(fn, interface):
+        with override_settings(ROOT_URLCONF=urlconf(interface)):
+            start = time.perf_counter()
+            check(fn())
+            rate = requests / (time.perf_counter() - start)
+
+            # Second pass, tracemalloc would slow down the timed one
+            peak_threads, done = [threading.active_count()], threading.Event()
+
+            def sample_threads():
+                while not done.wait(0.01):
+                    peak_threads.append(threading.active_count())
+
+            sampler = threading.Thread(target=sample_threads)
+            sampler.start()
+            tracemalloc.start()
+            try:
+                check(fn())
+                _, peak_memory = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+                done.set()
+                sampler.join()
+        # The sampler itself is not counted
+        return rate, peak_memory, max(peak_threads) - 1
+
+    runs = [
+        ('WSGI, thread per connection', run_wsgi, views),
+        ('ASGI, sync views', run_asgi, views),
+        ('ASGI, async views', run_asgi, async_views),
+    ]
+    results = [(name, *measure_run(fn, module)) for name, fn, module in runs]
+
+    report(
+        f'PUT /api/user/, {requests} requests, {concurrency} connections, '
+        f'{threads} WSGI threads, {latency * 1000:.0f} ms to send a body',
+        [(name, rate) for name, rate, _, _ in results],
+    )
+    print('  peak Python memory per connection, thread stacks excluded')
+    for name, _, peak_memory, peak_threads in results:
+        print(
+            f'  {name:<32} {peak_memory / concurrency / 1024:>9,.1f} KiB'
+            f'  {peak_threads:>4} threads'
+        )
+
+
+if __name__ == '__main__':
+    main()
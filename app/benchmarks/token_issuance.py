@@ -0,0 +1,72 @@
+"""
+Token issuance on repeat logins: get_or_create against the cached path
+
+    python -m benchmarks.token_issuance [--users 200] [--rounds 20]
+"""
+import argparse
+import itertools
+
+from benchmarks import measure, report, setup_django, teardown_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    old_name = setup_django()
+    try:
+        run(args.users, args.rounds)
+    finally:
+        teardown_django(old_name)
+
+
+def run(user_count, rounds):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.authtoken.models import Token
+
+    from connector.models import UserModel
+    from connector.operations import TokenOperations
+
+    UserModel.objects.bulk_create(
+        UserModel(username=f'bench{i}', email=f'bench{i}@example.com')
+        for i in range(user_count)
+    )
+    users = list(UserModel.objects.all())
+    iterations = user_count * rounds
+
+    def get_or_create(users=itertools.cycle(users)):
+        Token.objects.get_or_create(user=next(users))
+
+    def cached(users=itertools.cycle(users)):
+        TokenOperations().get_or_create_token(next(users))
+
+    # First logins create the tokens, the benchmark measures repeat logins
+    for user in users:
+        TokenOperations().get_or_create_token(user)
+
+    with CaptureQueriesContext(connection) as get_or_create_queries:
+        get_or_create_rate = measure(get_or_create, iterations)
+    with CaptureQueriesContext(connection) as cached_queries:
+        cached_rate = measure(cached, iterations)
+    cache.clear()
+
+    report(
+        f'Repeat logins, {user_count} users x {rounds} rounds',
+        [
+            ('Token.objects.get_or_create', get_or_create_rate),
+            ('TokenOperations (cached)', cached_rate),
+        ],
+    )
+    print(
+        f'  queries per login: get_or_create '
+        f'{len(get_or_create_queries) / iterations:.2f}, '
+        f'cached {len(cached_queries) / iterations:.2f}'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+GET /api/user/ body: model_to_dict and JSONRenderer against the
+projection serializer and ORJSONRenderer
+
+    python -m benchmarks.user_serialization [--iterations 20000]
+"""
+import argparse
+
+from benchmarks import measure, report, setup_django, teardown_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    old_name = setup_django()
+    try:
+        run(args.iterations)
+    finally:
+        teardown_django(old_name)
+
+
+def run(iterations):
+    from django.forms import model_to_dict
+    from rest_framework.renderers import JSONRenderer
+
+    from connector.models import UserModel
+    from connector.renderers import ORJSONRenderer
+    from connector.serializers import UserProjectionSerializer
+
+    user = UserModel.objects.create_user(
+        username='bench',
+        email='bench@example.com',
+        first_name='Bench',
+        last_name='Mark',
+        password='Bench-mark-1!',
+    )
+    # Prefetched, so the baseline measures serialization and not queries
+    user = UserModel.objects.prefetch_related(
+        'groups', 'user_permissions'
+    ).get(pk=user.pk)
+    json_renderer, orjson_renderer = JSONRenderer(), ORJSONRenderer()
+
+    def baseline():
+        json_renderer.render(model_to_dict(user))
+
+    def projection():
+        json_renderer.render(UserProjectionSerializer.to_representation(user))
+
+    def projection_orjson():
+        orjson_renderer.render(
+            UserProjectionSerializer.to_representation(user)
+        )
+
+    report(
+        f'User response body, {iterations} renders',
+        [
+            ('model_to_dict + JSONRenderer', measure(baseline, iterations)),
+            ('projection + JSONRenderer', measure(projection, iterations)),
+            (
+                'projection + ORJSONRenderer',
+                measure(projection_orjson, iterations),
+            ),
+        ],
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ConnectorConfig(AppConfig):
     name = 'connector'
+
+    def ready(self):
+        from connector import signals  # noqa: F401
@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from connector import views
+
+DEFAULT_ASYNC_VIEW_THREADS = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_thread_executor():
+    """
+    Returns the thread pool of the async views, creating it on first use
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(
+                        settings,
+                        'ASYNC_VIEW_THREADS',
+                        DEFAULT_ASYNC_VIEW_THREADS,
+                    ),
+                    thread_name_prefix='async-view',
+                )
+    return _executor
+
+
+def _call_with_connections(fn, *args, **kwargs):
+    # Pool threads outlive requests, their connections are checked like
+    # the ones of a WSGI worker at the request boundaries
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_thread(fn, *args, **kwargs):
+    """
+    Runs blocking fn on the async view threads, off the event loop
+    Returns: the result of fn
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_thread_executor(),
+        functools.partial(
+            context.run, _call_with_connections, fn, *args, **kwargs
+        ),
+    )
+
+
+class AsyncAPIViewMixin:
+    """
+    Dispatches a DRF view on the event loop
+
+    Django 3.2 runs every sync view of an ASGI application on one shared
+    thread. Here authentication, throttling and a sync handler run
+    together in a single hop to the async view threads, so concurrent
+    requests only wait on each other for a free thread. Handlers that are
+    coroutine functions are awaited on the event loop.
+    """
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        view = super().as_view(*args, **kwargs)
+
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        return async_view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            response = await run_in_thread(
+                self.handle, request, *args, **kwargs
+            )
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    def handle(self, request, *args, **kwargs):
+        """
+        Runs the checks of the request and calls its handler
+        Returns: the response, or a coroutine for async handlers
+        """
+        self.initial(request, *args, **kwargs)
+        if request.method.lower() in self.http_method_names:
+            handler = getattr(
+                self, request.method.lower(), self.http_method_not_allowed
+            )
+        else:
+            handler = self.http_method_not_allowed
+        return handler(request, *args, **kwargs)
+
+
+class UserLoginView(AsyncAPIViewMixin, views.UserLoginView):
+    """
+    User login view, served under ASGI
+    """
+
+
+class EmailVerificationViewSet(
+    AsyncAPIViewMixin, views.EmailVerificationViewSet
+):
+    """
+    Email verification view, served under ASGI
+    """
+
+
+class UserViewSet(AsyncAPIViewMixin, views.UserViewSet):
+    """
+    User view, served under ASGI
+    """
@@ -0,0 +1,257 @@
+import datetime
+import hashlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import (
+    JWTStatelessUserAuthentication,
+)
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from connector.models import UserModel
+from connector.revocation import get_revocation_list
+from connector.utils import tools
+from connector.utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_CACHE_SETTINGS = {
+    'MAX_SIZE': 10000,
+    'LOCAL_TIMEOUT': 5,
+    'REDIS_TIMEOUT': 300,
+}
+
+
+# Caches a user unless an invalidation already saw a newer version of it
+SET_UNLESS_STALE_SCRIPT = '''
+local floor = redis.call('GET', KEYS[2])
+if floor and tonumber(floor) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+'''
+
+
+def token_digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    Two-tier cache of the users behind DRF token keys
+
+    The first tier is an in-process LRU with a short timeout, the second is
+    Redis. Entries hold the user columns needed to rebuild the instance,
+    without the password hash, and are keyed by a digest of the token key.
+    Invalidations are published on a Redis channel so every worker drops
+    its local copy at once, the local timeout bounds staleness if a message
+    is lost.
+
+    An invalidation for a saved user also records its new version as the
+    floor of the entry, so a request that read the row before the save
+    committed cannot cache the older version again.
+    """
+
+    redis_key = 'auth-token-user:{digest}'
+    floor_key = 'auth-token-floor:{digest}'
+    channel = 'auth-token-invalidations'
+
+    def __init__(self, max_size, local_timeout, redis_timeout):
+        self.local = LRUCache(max_size, local_timeout)
+        self.floors = LRUCache(max_size, redis_timeout)
+        self.redis_timeout = redis_timeout
+        self.field_names = tuple(
+            field.attname
+            for field in UserModel._meta.concrete_fields
+            if field.attname != 'password'
+        )
+        self._fields = tuple(
+            UserModel._meta.get_field(name) for name in self.field_names
+        )
+
+    def get(self, key):
+        """
+        Returns the user of the token key, or None on a cache miss
+        """
+        digest = token_digest(key)
+        values = self.local.get(digest)
+        if values is None:
+            values = self._redis_get(digest)
+            if values is None:
+                return None
+            self.local.set(digest, values)
+        # Every hit gets its own instance, they are never shared by requests
+        return UserModel.from_db(
+            UserModel._default_manager.db, self.field_names, values
+        )
+
+    def set(self, key, user):
+        """
+        Caches the user of the token key, unless it is older than the
+        version of the last invalidation
+        """
+        digest = token_digest(key)
+        floor = self.floors.get(digest)
+        if floor is not None and user.version < floor:
+            return
+        values = tuple(getattr(user, name) for name in self.field_names)
+        if self._redis_set(digest, values, user.version):
+            self.local.set(digest, values)
+
+    def invalidate(self, key, version=None):
+        """
+        Drops the token key, `version` is the user version it was saved at
+        """
+        digest = token_digest(key)
+        if version is not None:
+            self.floors.set(digest, version)
+        self.local.delete(digest)
+        client = self._get_redis_client()
+        if client is None:
+            return
+        try:
+            if version is not None:
+                client.set(
+                    self.floor_key.format(digest=digest),
+                    version,
+                    ex=self.redis_timeout,
+                )
+            client.delete(self.redis_key.format(digest=digest))
+            client.publish(self.channel, digest)
+        except RedisError:
+            logger.exception('Failed to invalidate cached token')
+
+    def _get_redis_client(self):
+        client = tools.get_redis_client()
+        if client is not None:
+            tools.subscribe(self.channel, self._on_invalidation)
+        return client
+
+    def _on_invalidation(self, message):
+        digest = message['data']
+        if isinstance(digest, bytes):
+            digest = digest.decode()
+        self.local.delete(digest)
+
+    def _redis_get(self, digest):
+        client = self._get_redis_client()
+        if client is None:
+            return None
+        try:
+            data = client.get(self.redis_key.format(digest=digest))
+        except RedisError:
+            logger.exception('Failed to read cached token')
+            return None
+        if data is None:
+            return None
+        return tuple(
+            field.to_python(value)
+            for field, value in zip(self._fields, json.loads(data))
+        )
+
+    def _redis_set(self, digest, values, version):
+        """
+        Returns: False when an invalidation saw a newer version
+        """
+        client = self._get_redis_client()
+        if client is None:
+            return True
+        data = json.dumps(
+            [
+                value.isoformat()
+                if isinstance(value, datetime.datetime)
+                else value
+                for value in values
+            ]
+        )
+        try:
+            return bool(
+                client.register_script(SET_UNLESS_STALE_SCRIPT)(
+                    keys=[
+                        self.redis_key.format(digest=digest),
+                        self.floor_key.format(digest=digest),
+                    ],
+                    args=[data, version, self.redis_timeout],
+                )
+            )
+        except RedisError:
+            logger.exception('Failed to cache token')
+            return True
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                config = {
+                    **DEFAULT_TOKEN_CACHE_SETTINGS,
+                    **getattr(settings, 'AUTH_TOKEN_CACHE', {}),
+                }
+                _token_cache = TokenCache(
+                    max_size=config['MAX_SIZE'],
+                    local_timeout=config['LOCAL_TIMEOUT'],
+                    redis_timeout=config['REDIS_TIMEOUT'],
+                )
+    return _token_cache
+
+
+def invalidate_token(key, version=None):
+    """
+    Drops a token key from every cache tier of every worker
+    Parameters: key, version  (user version the token was saved at)
+    """
+    get_token_cache().invalidate(key, version)
+
+
+def invalidate_user_tokens(*user_ids, versions=None):
+    """
+    Drops the tokens of the users from every cache tier of every worker
+    Parameters: user_ids, versions  (user version of each saved user)
+    """
+    for key, user_id in Token.objects.filter(user_id__in=user_ids).values_list(
+        'key', 'user_id'
+    ):
+        invalidate_token(key, None if versions is None else versions[user_id])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in TokenAuthentication that skips the database for cached tokens
+
+    Only tokens of active users are cached, deleting a token or saving
+    its user invalidates the entry.
+    """
+
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
+
+
+class JWTRevocationAuthentication(JWTStatelessUserAuthentication):
+    """
+    Stateless JWT authentication that rejects revoked tokens
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if get_revocation_list().is_access_revoked(token):
+            raise InvalidToken(_('Token is revoked'))
+        return token
@@ -0,0 +1,160 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db import close_old_connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from connector import hashing
+from connector.identities import (
+    get_identity_filter,
+    get_identity_filter_settings,
+)
+from connector.tokens import PROFILE_CLAIM_FIELDS
+
+logger = logging.getLogger(__name__)
+
+UserModel = get_user_model()
+
+# Single thread, upgrades are rare and their hashing runs on the pool anyway
+_rehash_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='password-rehash'
+)
+
+
+def upgrade_password(user_id, password, encoded):
+    """
+    Stores a new hash of the password with the current hasher settings
+
+    The update only applies while the stored hash is still `encoded`, so a
+    password changed in the meantime is never overwritten.
+    """
+    try:
+        UserModel._default_manager.filter(pk=user_id, password=encoded).update(
+            password=hashing.make_password(password)
+        )
+    except Exception:
+        logger.exception('Password hash upgrade failed for user %s', user_id)
+
+
+def _upgrade_password_in_background(user_id, password, encoded):
+    close_old_connections()
+    try:
+        upgrade_password(user_id, password, encoded)
+    finally:
+        close_old_connections()
+
+
+class HashingPoolModelBackend(ModelBackend):
+    """
+    ModelBackend that checks passwords on the hashing process pool
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user
+            hashing.make_password(password)
+        else:
+            if self.check_password(
+                user, password
+            ) and self.user_can_authenticate(user):
+                return user
+        return None
+
+    def check_password(self, user, password):
+        is_correct, must_update = hashing.verify_password(
+            password, user.password
+        )
+        if is_correct and must_update:
+            if settings.PASSWORD_REHASH_IN_BACKGROUND:
+                _rehash_executor.submit(
+                    _upgrade_password_in_background,
+                    user.pk,
+                    password,
+                    user.password,
+                )
+            else:
+                upgrade_password(user.pk, password, user.password)
+        return is_correct
+
+
+class UsernameOrEmailBackend(HashingPoolModelBackend):
+    """
+    Authenticates by username or email in one query
+
+    Both are matched case-insensitively against the LOWER() indexes of
+    the user table, and only the columns the login needs are loaded.
+    """
+
+    login_fields = ('id', 'password', 'is_active', 'username', 'email')
+
+    def authenticate(
+        self, request, username=None, password=None, email=None, **kwargs
+    ):
+        identifier = username or email or kwargs.get(UserModel.EMAIL_FIELD)
+        if not identifier or password is None:
+            return None
+        if self.is_unknown(identifier):
+            return None
+        user = self.get_login_user(identifier)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user
+            hashing.make_password(password)
+        elif self.check_password(
+            user, password
+        ) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def is_unknown(self, identifier):
+        """
+        Whether the identity filter proves that no user has the identifier
+
+        Only trusted while the filter is complete, a user it missed must
+        still be able to log in. Skipping the dummy hash reveals no more
+        than the availability endpoint does.
+        """
+        if not get_identity_filter_settings()['LOGIN_SHORT_CIRCUIT']:
+            return False
+        identity_filter = get_identity_filter()
+        return not identity_filter.might_exist(identifier) and (
+            identity_filter.is_complete()
+        )
+
+    def get_login_fields(self):
+        if settings.JWT_PROFILE_CLAIMS:
+            # The access token of the login carries the profile claims
+            return (*self.login_fields, *PROFILE_CLAIM_FIELDS, 'version')
+        return self.login_fields
+
+    def get_login_user(self, identifier):
+        lowered = identifier.lower()
+        users = list(
+            UserModel._default_manager.alias(
+                username_lower=Lower('username'), email_lower=Lower('email')
+            )
+            .filter(Q(username_lower=lowered) | Q(email_lower=lowered))
+            .only(*self.get_login_fields())[:2]
+        )
+        if len(users) == 1:
+            return users[0]
+        # Accounts that differ only in case need the exact spelling
+        return next(
+            (
+                user
+                for user in users
+                if identifier in (user.username, user.email)
+            ),
+            None,
+        )
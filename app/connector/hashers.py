@@ -0,0 +1,73 @@
+import math
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+)
+
+
+class CalibratedHasherMixin:
+    """
+    Reads the work factor of the hasher from settings.PASSWORD_HASHER_COSTS
+
+    The costs are written by the calibrate_hashers command, hashers fall
+    back to the Django defaults when the host has not been calibrated.
+    """
+
+    cost_parameter = None
+
+    def __init__(self):
+        costs = settings.PASSWORD_HASHER_COSTS.get(self.algorithm, {})
+        if self.cost_parameter in costs:
+            setattr(self, self.cost_parameter, costs[self.cost_parameter])
+
+    @property
+    def cost(self):
+        return getattr(self, self.cost_parameter)
+
+    @cost.setter
+    def cost(self, value):
+        setattr(self, self.cost_parameter, value)
+
+    @property
+    def default_cost(self):
+        return getattr(type(self), self.cost_parameter)
+
+    def scale_cost(self, elapsed, target):
+        """
+        Returns the cost that makes one hash take about `target` seconds,
+        given that the current cost took `elapsed` seconds
+        """
+        return max(1, round(self.cost * target / elapsed))
+
+
+class CalibratedPBKDF2PasswordHasher(
+    CalibratedHasherMixin, PBKDF2PasswordHasher
+):
+    cost_parameter = 'iterations'
+
+    def scale_cost(self, elapsed, target):
+        return max(1000, round(super().scale_cost(elapsed, target), -3))
+
+
+class CalibratedArgon2PasswordHasher(
+    CalibratedHasherMixin, Argon2PasswordHasher
+):
+    cost_parameter = 'memory_cost'
+
+    def scale_cost(self, elapsed, target):
+        # Argon2 needs at least 8 KiB per lane
+        return max(8 * self.parallelism, super().scale_cost(elapsed, target))
+
+
+class CalibratedBCryptSHA256PasswordHasher(
+    CalibratedHasherMixin, BCryptSHA256PasswordHasher
+):
+    cost_parameter = 'rounds'
+
+    def scale_cost(self, elapsed, target):
+        # Every extra bcrypt round doubles the hashing time
+        rounds = self.rounds + round(math.log2(target / elapsed))
+        return min(31, max(4, rounds))
@@ -0,0 +1,296 @@
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+)
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXECUTOR_SETTINGS = {
+    'ENABLED': True,
+    'MAX_WORKERS': None,
+    'MAX_QUEUE_SIZE': 64,
+    'TIMEOUT': 5,
+    'START_METHOD': 'spawn',
+}
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Password hashing is busy, try again later.'
+    default_code = 'hashing_unavailable'
+
+
+def _init_worker():
+    """
+    Configures Django in a freshly started pool process
+    """
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uservice.settings')
+    django.setup()
+
+
+def _start_worker():
+    """
+    No-op job, its result tells that a pool process is set up
+    """
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _make_passwords(passwords):
+    return [hashers.make_password(password) for password in passwords]
+
+
+def _verify_password(password, encoded):
+    """
+    Mirrors django.contrib.auth.hashers.check_password, but returns
+    whether the stored hash must be upgraded instead of calling a setter
+    """
+    if password is None or not hashers.is_password_usable(encoded):
+        return False, False
+
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False, False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = hasher.verify(password, encoded)
+
+    # Close the timing gap between the stored and the default work factor
+    if not is_correct and not hasher_changed and must_update:
+        hasher.harden_runtime(password, encoded)
+
+    return is_correct, must_update
+
+
+class HashingExecutor:
+    """
+    Runs password hashing jobs on a process pool
+
+    The pool keeps PBKDF2 off the request threads, so a burst of logins
+    saturates the CPUs instead of holding the GIL of the gunicorn worker.
+    Submissions beyond max_workers + max_queue_size are rejected, and
+    every call waits at most `timeout` seconds for its result.
+    """
+
+    def __init__(
+        self, max_workers=None, max_queue_size=64, timeout=5, start_method=None
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(
+            self.max_workers + max_queue_size
+        )
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+        )
+
+    def start(self):
+        """
+        Starts every pool process and waits until Django is set up in them
+        """
+        futures = [
+            self._pool.submit(_start_worker) for _ in range(self.max_workers)
+        ]
+        for future in futures:
+            future.result()
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            logger.warning('Password hashing queue is full')
+            raise HashingUnavailable()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning('Password hashing timed out')
+            raise HashingUnavailable()
+
+    def map(self, fn, items, chunk_size):
+        """
+        Runs fn on chunks of items, fn takes and returns a list
+
+        At most max_workers chunks are queued at once, so a batch leaves
+        queue slots for the interactive calls.
+        Returns: the concatenated results, in order
+        """
+        results, in_flight = [], deque()
+        for start in range(0, len(items), chunk_size):
+            if len(in_flight) >= self.max_workers:
+                results.extend(self._chunk_result(*in_flight.popleft()))
+            stop = start + chunk_size
+            chunk = items[start:stop]
+            in_flight.append((self.submit(fn, chunk), len(chunk)))
+        while in_flight:
+            results.extend(self._chunk_result(*in_flight.popleft()))
+        return results
+
+    def _chunk_result(self, future, size):
+        try:
+            return future.result(timeout=self.timeout * size)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning('Password hashing timed out')
+            raise HashingUnavailable()
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+class InlineExecutor:
+    """
+    Runs hashing jobs on the calling thread
+    """
+
+    def start(self):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def run(self, fn, *args):
+        return fn(*args)
+
+    def map(self, fn, items, chunk_size):
+        return fn(list(items))
+
+    def shutdown(self, wait=True):
+        pass
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor_settings():
+    return {
+        **DEFAULT_EXECUTOR_SETTINGS,
+        **getattr(settings, 'PASSWORD_HASHING_EXECUTOR', {}),
+    }
+
+
+def get_executor():
+    """
+    Returns the hashing executor of this process, creating it on first use
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                config = get_executor_settings()
+                if config['ENABLED']:
+                    _executor = HashingExecutor(
+                        max_workers=config['MAX_WORKERS'],
+                        max_queue_size=config['MAX_QUEUE_SIZE'],
+                        timeout=config['TIMEOUT'],
+                        start_method=config['START_METHOD'],
+                    )
+                else:
+                    _executor = InlineExecutor()
+    return _executor
+
+
+def reset_executor():
+    """
+    Shuts down the current executor, the next call starts a new one
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _run(fn, *args, method='run'):
+    try:
+        return getattr(get_executor(), method)(fn, *args)
+    except BrokenProcessPool:
+        logger.exception('Password hashing pool is broken, restarting it')
+        reset_executor()
+        raise HashingUnavailable()
+
+
+def make_password(password):
+    """
+    Returns the hash of the given raw password
+    """
+    return _run(_make_password, password)
+
+
+def make_passwords(passwords, chunk_size=16):
+    """
+    Returns the hashes of the given raw passwords, in order, hashing them
+    in parallel on the pool
+    """
+    return _run(_make_passwords, list(passwords), chunk_size, method='map')
+
+
+def is_encoded(password):
+    """
+    Tells whether a password already is a hash of a configured hasher, or
+    an unusable password
+    """
+    if password.startswith(hashers.UNUSABLE_PASSWORD_PREFIX):
+        return True
+    try:
+        hashers.identify_hasher(password)
+    except ValueError:
+        return False
+    return True
+
+
+# algorithm$..., modular crypt $id$... and unsalted MD5 or SHA1 digests
+ENCODED_PATTERN = re.compile(
+    r'^(?:[a-z][a-z0-9_]*\$|\$[a-z0-9]+\$|[0-9a-f]{32}$|[0-9a-f]{40}$)'
+)
+
+
+def looks_encoded(password):
+    """
+    Tells whether a password has the shape of a hash, of any hasher
+    """
+    return bool(ENCODED_PATTERN.match(password))
+
+
+def verify_password(password, encoded):
+    """
+    Checks a raw password against its stored hash
+    Returns: (is_correct, must_update)
+    """
+    return _run(_verify_password, password, encoded)
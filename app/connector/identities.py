@@ -0,0 +1,255 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from redis.exceptions import RedisError
+
+from connector.models import UserModel
+from connector.utils import tools
+from connector.utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDENTITY_FILTER_SETTINGS = {
+    'ERROR_RATE': 0.01,
+    'SYNC_INTERVAL': 5,
+    'REBUILD_INTERVAL': 600,
+    'LOGIN_SHORT_CIRCUIT': True,
+}
+
+# Rows committed out of primary key order are picked up by re-reading
+# the last few primary keys on every sync
+SYNC_OVERLAP = 100
+
+
+class IdentityFilter:
+    """
+    Per-worker Bloom filter of the lowercased usernames and emails in use
+
+    A miss proves that no user has the identity, so most availability
+    checks and logins with an unknown name never reach the database. A hit
+    still needs a database check. Usernames cannot contain `@`, so both
+    kinds share one filter.
+
+    The filter is built from a streamed scan of the user table, new users
+    are read by primary key every `sync_interval` seconds, and saved users
+    are broadcast to every worker. Deleted users stay in the filter until
+    the next rebuild, which only costs a database check.
+
+    Under gunicorn the master builds the filter and the workers inherit
+    it. Users saved before a worker subscribed are missing from it until
+    the next rebuild, so a miss only proves an unknown user once the
+    filter is complete.
+    """
+
+    channel = 'user-identities'
+
+    def __init__(self, error_rate, sync_interval, rebuild_interval):
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.bloom = None
+        self.max_pk = 0
+        self.built_at = None
+        self.built_from = None
+        self.synced_at = None
+        self.subscribed_at = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        # Only a list while a rebuild reads the table
+        self._added_during_rebuild = None
+
+    def might_exist(self, identity):
+        """
+        Returns False only if no user has the username or email
+        """
+        self._refresh()
+        return identity.lower() in self.bloom
+
+    def is_shared(self):
+        """
+        Whether users saved by other workers reach this filter at once
+        """
+        return tools.subscribe(
+            self.channel, self._on_saved, on_subscribe=self._on_subscribed
+        )
+
+    def is_complete(self):
+        """
+        Whether a miss proves that no user has the identity
+
+        True while broadcasts are received and the filter was built after
+        the subscription started, so no saved user was missed.
+        """
+        return (
+            self.is_shared()
+            and self.built_from is not None
+            and self.built_from >= self.subscribed_at
+        )
+
+    def build(self):
+        """
+        Builds the filter, or adds the users created since and rebuilds it
+        in the background once older than rebuild_interval
+
+        For callers no request waits on, like the gunicorn master before
+        the first fork and the worker warm-up.
+        """
+        if self.bloom is None:
+            with self._rebuild_lock:
+                if self.bloom is None:
+                    self.rebuild()
+            return
+        self.sync()
+        if time.monotonic() - self.built_at >= self.rebuild_interval:
+            self._rebuild_later()
+
+    def add(self, *identities):
+        """
+        Adds the identities of a saved user in every worker
+        """
+        identities = [identity for identity in identities if identity]
+        self._add(identities)
+        client = tools.get_redis_client()
+        if client is None:
+            return
+        try:
+            client.publish(self.channel, '\n'.join(identities))
+        except RedisError:
+            logger.exception('Failed to broadcast user identities')
+
+    def rebuild(self):
+        """
+        Replaces the filter with one built from the user table
+        """
+        started_at = time.monotonic()
+        with self._lock:
+            if self._added_during_rebuild is None:
+                self._added_during_rebuild = []
+        users = UserModel._default_manager.order_by().values_list(
+            'pk', 'username', 'email'
+        )
+        try:
+            bloom = BloomFilter(max(1000, 2 * users.count()), self.error_rate)
+            max_pk = 0
+            for pk, username, email in users.iterator(chunk_size=5000):
+                for identity in (username, email):
+                    if identity:
+                        bloom.add(identity.lower())
+                max_pk = max(max_pk, pk)
+        except Exception:
+            with self._lock:
+                self._added_during_rebuild = None
+            raise
+        with self._lock:
+            # Keep the users saved while the table was being read
+            for identity in self._added_during_rebuild:
+                bloom.add(identity)
+            self._added_during_rebuild = None
+            self.bloom = bloom
+            self.max_pk = max_pk
+            self.built_from = started_at
+            self.built_at = self.synced_at = time.monotonic()
+
+    def sync(self):
+        """
+        Adds the users created since the last build or sync
+        """
+        users = (
+            UserModel._default_manager.filter(
+                pk__gt=self.max_pk - SYNC_OVERLAP
+            )
+            .order_by()
+            .values_list('pk', 'username', 'email')
+        )
+        max_pk = self.max_pk
+        for pk, username, email in users:
+            self._add([username, email])
+            max_pk = max(max_pk, pk)
+        self.max_pk = max_pk
+        self.synced_at = time.monotonic()
+
+    def _refresh(self):
+        self.is_shared()
+        if self.bloom is None:
+            with self._rebuild_lock:
+                if self.bloom is None:
+                    self.rebuild()
+            return
+        now = time.monotonic()
+        if now - self.built_at >= self.rebuild_interval:
+            self._rebuild_later()
+        elif now - self.synced_at >= self.sync_interval:
+            if self._sync_lock.acquire(blocking=False):
+                try:
+                    self.sync()
+                finally:
+                    self._sync_lock.release()
+
+    def _on_subscribed(self, renewed):
+        self.subscribed_at = time.monotonic()
+        # Broadcasts were lost while the subscription was down. An
+        # inherited filter is left to the scheduled rebuild, the workers
+        # of one master would scan the user table at once otherwise
+        if renewed and self.bloom is not None:
+            self._rebuild_later()
+
+    def _rebuild_later(self):
+        if self._rebuild_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._rebuild_in_background, daemon=True
+            ).start()
+
+    def _rebuild_in_background(self):
+        close_old_connections()
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Failed to rebuild the identity filter')
+        finally:
+            close_old_connections()
+            self._rebuild_lock.release()
+
+    def _add(self, identities):
+        # Before the first build the table scan will find them
+        with self._lock:
+            for identity in identities:
+                identity = identity.lower()
+                if self.bloom is not None:
+                    self.bloom.add(identity)
+                if self._added_during_rebuild is not None:
+                    self._added_during_rebuild.append(identity)
+
+    def _on_saved(self, message):
+        identities = message['data']
+        if isinstance(identities, bytes):
+            identities = identities.decode()
+        self._add(identities.split('\n'))
+
+
+_identity_filter = None
+_identity_filter_lock = threading.Lock()
+
+
+def get_identity_filter_settings():
+    return {
+        **DEFAULT_IDENTITY_FILTER_SETTINGS,
+        **getattr(settings, 'IDENTITY_FILTER', {}),
+    }
+
+
+def get_identity_filter():
+    global _identity_filter
+    if _identity_filter is None:
+        with _identity_filter_lock:
+            if _identity_filter is None:
+                config = get_identity_filter_settings()
+                _identity_filter = IdentityFilter(
+                    error_rate=config['ERROR_RATE'],
+                    sync_interval=config['SYNC_INTERVAL'],
+                    rebuild_interval=config['REBUILD_INTERVAL'],
+                )
+    return _identity_filter
@@ -0,0 +1,107 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from connector.hashers import CalibratedHasherMixin
+
+BENCHMARK_PASSWORD = 'Calibrate-hashers-1!'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the configured password hashers on this host and '
+        'writes the work factors that meet the latency target to '
+        'PASSWORD_HASHER_COSTS_FILE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms',
+            type=float,
+            default=150,
+            help='Time one password hash should take, in milliseconds.',
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=5,
+            help='Hashes timed per hasher, the median is used.',
+        )
+        parser.add_argument(
+            '--allow-below-default',
+            action='store_true',
+            help='Allow work factors below the Django defaults.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the work factors without writing them.',
+        )
+
+    def handle(self, *args, **options):
+        target = options['target_ms'] / 1000
+        costs = self.load_costs()
+
+        # Fresh instances, so benchmarking never alters the cached hashers
+        for hasher_path in settings.PASSWORD_HASHERS:
+            hasher = import_string(hasher_path)()
+            if not isinstance(hasher, CalibratedHasherMixin):
+                continue
+            if hasher.library:
+                try:
+                    hasher._load_library()
+                except ValueError as e:
+                    self.stdout.write(f'Skipping {hasher.algorithm}: {e}')
+                    continue
+
+            elapsed = self.time_hasher(hasher, options['samples'])
+            cost = hasher.scale_cost(elapsed, target)
+            if cost < hasher.default_cost and not (
+                options['allow_below_default']
+            ):
+                self.stderr.write(
+                    f'{hasher.algorithm}: {cost} {hasher.cost_parameter} '
+                    f'is below the Django default, keeping '
+                    f'{hasher.default_cost}'
+                )
+                cost = hasher.default_cost
+
+            hasher.cost = cost
+            measured = self.time_hasher(hasher, options['samples'])
+            costs[hasher.algorithm] = {hasher.cost_parameter: cost}
+            self.stdout.write(
+                f'{hasher.algorithm}: {hasher.cost_parameter}={cost} '
+                f'({measured * 1000:.0f} ms per hash)'
+            )
+
+        if options['dry_run']:
+            return
+
+        with open(settings.PASSWORD_HASHER_COSTS_FILE, 'w') as costs_file:
+            json.dump(costs, costs_file, indent=2, sort_keys=True)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Wrote {settings.PASSWORD_HASHER_COSTS_FILE}, restart the '
+                f'service to apply it. Stored hashes are upgraded on login.'
+            )
+        )
+
+    def load_costs(self):
+        try:
+            with open(settings.PASSWORD_HASHER_COSTS_FILE) as costs_file:
+                return json.load(costs_file)
+        except FileNotFoundError:
+            return {}
+
+    def time_hasher(self, hasher, samples):
+        salt = hasher.salt()
+        timings = []
+        for _ in range(max(1, samples)):
+            start = time.perf_counter()
+            hasher.encode(BENCHMARK_PASSWORD, salt)
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from connector.operations import UserExportOperations
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes every user as NDJSON or CSV, in primary key order. '
+        'Resume an interrupted export with --after and the id of the last '
+        'user written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            choices=('ndjson', 'csv'),
+            default='ndjson',
+            help='Format of the export.',
+        )
+        parser.add_argument(
+            '--after',
+            type=int,
+            default=0,
+            help='Export only the users with a greater id.',
+        )
+        parser.add_argument(
+            '--file',
+            help='File to write, standard output by default.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Users read per query.',
+        )
+
+    def handle(self, *args, **options):
+        operations = UserExportOperations(chunk_size=options['chunk_size'])
+        lines = operations.export(
+            output=options['output'], after=options['after']
+        )
+        if options['file']:
+            # A resumed export continues the same file
+            mode = 'a' if options['after'] else 'w'
+            with open(options['file'], mode, newline='') as export_file:
+                count = self.write_lines(export_file.write, lines)
+        else:
+            count = self.write_lines(
+                lambda line: self.stdout.write(line, ending=''), lines
+            )
+        self.stderr.write(f'Exported {count} lines')
+
+    def write_lines(self, write, lines):
+        count = 0
+        for line in lines:
+            write(line.decode() if isinstance(line, bytes) else line)
+            count += 1
+        return count
@@ -0,0 +1,156 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+import orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from connector.operations import BulkUserOperations
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports users from a CSV or NDJSON file. Password hashes of a '
+        'configured hasher are kept, raw passwords are hashed on the '
+        'hashing pool. Progress is checkpointed after every chunk and an '
+        'interrupted import resumes from the checkpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import.')
+        parser.add_argument(
+            '--input',
+            choices=('ndjson', 'csv'),
+            help='Format of the file, guessed from its extension by default.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.BULK_USERS_CHUNK_SIZE,
+            help='Rows validated and inserted at once.',
+        )
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help=(
+                'Let the database skip rows whose username or email is '
+                'taken instead of reporting them.'
+            ),
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file, PATH.checkpoint by default.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint and import from the first row.',
+        )
+        parser.add_argument(
+            '--errors',
+            help='File the rejected rows are appended to, as NDJSON.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['input'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        progress = {'offset': 0, 'written': 0, 'rejected': 0}
+        if not options['restart']:
+            progress.update(self.load_checkpoint(checkpoint_path))
+        if progress['offset']:
+            self.stdout.write(f'Resuming after row {progress["offset"]}')
+
+        operations = BulkUserOperations(chunk_size=options['chunk_size'])
+        errors_file = (
+            open(options['errors'], 'a') if options['errors'] else None
+        )
+        start, resumed_at = time.perf_counter(), progress['offset']
+        try:
+            with open(path, newline='') as input_file:
+                rows = itertools.islice(
+                    self.read_rows(input_file, input_format),
+                    progress['offset'],
+                    None,
+                )
+                while True:
+                    chunk = list(itertools.islice(rows, options['chunk_size']))
+                    if not chunk:
+                        break
+                    written, errors = operations.import_users(
+                        chunk, ignore_conflicts=options['ignore_conflicts']
+                    )
+                    if errors_file is not None:
+                        for error in errors:
+                            # Rows are counted from 1, the CSV header aside
+                            row = progress['offset'] + error['index'] + 1
+                            errors_file.write(
+                                json.dumps(
+                                    {'row': row, 'errors': error['errors']}
+                                )
+                                + '\n'
+                            )
+                    progress['offset'] += len(chunk)
+                    progress['written'] += written
+                    progress['rejected'] += len(errors)
+                    self.save_checkpoint(checkpoint_path, progress)
+                    self.report(progress, resumed_at, start)
+        finally:
+            if errors_file is not None:
+                errors_file.close()
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Imported {progress["written"]} users, rejected '
+                f'{progress["rejected"]} rows'
+            )
+        )
+
+    def read_rows(self, input_file, input_format):
+        if input_format == 'csv':
+            for row in csv.DictReader(input_file):
+                # Empty cells are missing values
+                yield {key: value for key, value in row.items() if value != ''}
+            return
+        for line in input_file:
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # Rejected as invalid data by the row serializer
+                yield None
+
+    def load_checkpoint(self, checkpoint_path):
+        try:
+            with open(checkpoint_path) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            raise CommandError(
+                f'{checkpoint_path} is not a checkpoint, pass --restart to '
+                f'import from the first row'
+            )
+
+    def save_checkpoint(self, checkpoint_path, progress):
+        # Replace the file whole, a crash never leaves half a checkpoint
+        temporary_path = f'{checkpoint_path}.tmp'
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump(progress, checkpoint_file)
+        os.replace(temporary_path, checkpoint_path)
+
+    def report(self, progress, resumed_at, start):
+        elapsed = time.perf_counter() - start
+        rate = (progress['offset'] - resumed_at) / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{progress["offset"]} rows read, {progress["written"]} '
+            f'written, {progress["rejected"]} rejected ({rate:.0f} rows/s)'
+        )
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from connector.operations import UserPurgeOperations
+
+
+class Command(BaseCommand):
+    help = (
+        'Removes deleted users and everything that cascades from them, in '
+        'small batches. Runs as a worker unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.USERS_PURGE_BATCH_SIZE,
+            help='Users removed per transaction.',
+        )
+        parser.add_argument(
+            '--grace-period',
+            type=int,
+            default=settings.USERS_PURGE_GRACE_PERIOD,
+            help='Seconds a deleted user is kept before it is removed.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.USERS_PURGE_INTERVAL,
+            help='Seconds to wait when no deleted user is due.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Remove the users that are due, then exit.',
+        )
+
+    def handle(self, *args, **options):
+        operations = UserPurgeOperations(
+            batch_size=options['batch_size'],
+            grace_period=options['grace_period'],
+        )
+        while True:
+            count = operations.purge()
+            if count:
+                self.stdout.write(f'Purged {count} users')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
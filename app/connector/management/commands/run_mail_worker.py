@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from connector.outbox import get_outbox_sender, get_outbox_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Sends the emails of the outbox over a reused SMTP connection, '
+        'retrying failures with backoff. Runs until stopped unless --once '
+        'is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send the messages that are due, then exit.',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Print the queue depth and exit.',
+        )
+
+    def handle(self, *args, **options):
+        sender = get_outbox_sender()
+        if options['status']:
+            self.write_depth(sender)
+            return
+
+        interval = get_outbox_settings()['INTERVAL']
+        try:
+            while True:
+                sent, failed = sender.send_batch()
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} emails, {failed} failed')
+                    self.write_depth(sender)
+                elif options['once']:
+                    return
+                else:
+                    # Idle, the open connection would time out anyway
+                    sender.close()
+                    time.sleep(interval)
+        finally:
+            sender.close()
+
+    def write_depth(self, sender):
+        pending, dead = sender.queue_depth()
+        self.stdout.write(f'Outbox: {pending} waiting, {dead} given up')
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connector', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermodel',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='incremented on every update of the user'),
+        ),
+    ]
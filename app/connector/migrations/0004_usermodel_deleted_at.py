@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 23:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connector', '0003_usermodel_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermodel',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='set on deletion, the purge worker removes the row later', null=True),
+        ),
+    ]
@@ -1,6 +1,17 @@
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+
+class StaleVersionError(Exception):
+    """
+    Raised when saving a user that was updated since it was loaded
+
+    Raised after the save returns, so an enclosing atomic block is not
+    marked for rollback and the caller may go on querying.
+    """
 
 
 class UserModel(AbstractUser):
@@ -34,8 +45,64 @@ class UserModel(AbstractUser):
     )
     email = models.EmailField(unique=True)
     email_verified = models.BooleanField(default=False)
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text='incremented on every update of the user',
+    )
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text='set on deletion, the purge worker removes the row later',
+    )
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive username or email lookups on login
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
+    # Set by the last save when the row was at another version, nothing
+    # was written and no post_save receiver must act on it
+    stale = False
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        self.version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        self.stale = False
+        super().save(*args, **kwargs)
+        if self.stale:
+            self.version -= 1
+            raise StaleVersionError(
+                f'User {self.pk} was updated since it was loaded'
+            )
+
+    def _do_update(self, base_qs, using, pk_val, values, *args):
+        if self._state.adding:
+            return super()._do_update(base_qs, using, pk_val, values, *args)
+        # Optimistic concurrency, the row must still be at the version
+        # this instance was loaded with
+        updated = super()._do_update(
+            base_qs.filter(version=self.version - 1),
+            using,
+            pk_val,
+            values,
+            *args,
+        )
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            # Reported by save, an exception here would doom the
+            # enclosing transaction
+            self.stale = True
+            return True
+        return updated
+
     def create_superuser(self, username, email, password, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -46,3 +113,29 @@ class UserModel(AbstractUser):
         if extra_fields.get('is_superuser') is not True:
             raise ValueError('Superuser must have is_superuser=True.')
         return self._create_user(username, email, password, **extra_fields)
+
+
+class EmailOutbox(models.Model):
+    """
+    Email waiting to be sent by the mail worker
+    """
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True, null=True)
+    recipients = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        default=timezone.now,
+        help_text='null once the message has used up its attempts',
+    )
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'], name='outbox_next_attempt_idx'
+            ),
+        ]
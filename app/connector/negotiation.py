@@ -0,0 +1,17 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Picks the first parser and renderer whatever the client asks for
+
+    For views that stream their own response body, such as the user
+    export, so a client accepting only that media type does not get a
+    406. Their errors are still rendered as JSON.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
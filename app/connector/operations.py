@@ -1,21 +1,100 @@
+import csv
+import datetime
+import hmac
 import logging
-import random
+import secrets
 import string
 
+import orjson
 from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import APIException, NotFound
+from rest_framework.serializers import (
+    ValidationError as SerializerValidationError,
+)
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token as JWTToken
 
-from connector import serializers
-from connector.models import UserModel
+from connector import hashing, serializers
+from connector.authentication import invalidate_token, invalidate_user_tokens
+from connector.identities import get_identity_filter
+from connector.models import StaleVersionError, UserModel
+from connector.outbox import enqueue_mail
+from connector.revocation import get_revocation_list
+from connector.tokens import (
+    PROFILE_CLAIM,
+    PROFILE_CLAIM_FIELDS,
+    PROFILE_VERSION_CLAIM,
+    AccessToken,
+)
+from connector.utils import tools
 
 logger = logging.getLogger(__name__)
 
 
+class UserIdentityMap:
+    """
+    Users loaded while serving one request, by primary key
+
+    The map lives on the request and starts with the user resolved by
+    authentication, so the views and serializers of the request share one
+    instance instead of fetching the row again.
+    """
+
+    attribute = 'user_identity_map'
+
+    def __init__(self, user=None):
+        self.users = {}
+        if isinstance(user, UserModel):
+            self.add(user)
+
+    @classmethod
+    def for_request(cls, request):
+        django_request = getattr(request, '_request', request)
+        identity_map = getattr(django_request, cls.attribute, None)
+        if identity_map is None:
+            identity_map = cls(getattr(request, 'user', None))
+            setattr(django_request, cls.attribute, identity_map)
+        return identity_map
+
+    def add(self, user):
+        self.users[user.pk] = user
+        return user
+
+    def get(self, user_id):
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.add(UserModel.objects.get(pk=user_id))
+        return user
+
+    def discard(self, user_id):
+        self.users.pop(user_id, None)
+
+
+class VersionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'User was modified, fetch it again.'
+    default_code = 'version_conflict'
+
+
 class UserOperations:
     serializer_class = serializers.UserSerializer
 
+    def __init__(self, request=None):
+        self.identity_map = (
+            UserIdentityMap.for_request(request) if request else None
+        )
+
     def update_user(self, user_data, user_instance, context):
         """
         Updates user information in database
@@ -30,6 +109,13 @@ class UserOperations:
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
+        except StaleVersionError:
+            # The instance may come from a stale cache, drop it for retries
+            # without touching the database
+            request = context.get('request')
+            if request is not None and isinstance(request.auth, Token):
+                invalidate_token(request.auth.key)
+            raise VersionConflict()
         except UserModel.DoesNotExist as e:
             raise NotFound(e)
         except ValidationError as e:
@@ -39,10 +125,13 @@ class UserOperations:
 
     def get_user_instance(self, user_id):
         """
-        Returns user from the database on given ID
+        Returns user from the database on given ID, or from the identity
+        map of the request the operations were created for
         Parameters: user_id
         """
         try:
+            if self.identity_map is not None:
+                return self.identity_map.get(user_id)
             user = UserModel.objects.get(pk=user_id)
             return user
         except UserModel.DoesNotExist as e:
@@ -54,11 +143,18 @@ class UserOperations:
 
     def delete_user_record(self, user_instance):
         """
-        Deletes user record in database
+        Deactivates and tombstones the user in one UPDATE, so it can no
+        longer authenticate, the purge worker removes the row later
         Parameters: user_instance  (user instance on given id)
         """
         try:
-            user_instance.delete()
+            get_revocation_list().revoke_user(user_instance.pk)
+            if self.identity_map is not None:
+                self.identity_map.discard(user_instance.pk)
+            user_instance.is_active = False
+            user_instance.deleted_at = timezone.now()
+            # The post_save signal drops the cached tokens
+            user_instance.save(update_fields=['is_active', 'deleted_at'])
         except UserModel.DoesNotExist as e:
             raise NotFound(e)
         except ValidationError as e:
@@ -67,22 +163,747 @@ class UserOperations:
             raise APIException(e)
 
 
+class UserPurgeOperations:
+    """
+    Removes the rows of deleted users in small batches
+
+    Every batch is its own short transaction, so cascading over tokens,
+    admin log entries and group rows never holds locks on the user tables
+    for long. Rows are locked with SKIP LOCKED, several workers can purge
+    at once.
+    """
+
+    def __init__(self, batch_size=None, grace_period=None):
+        self.batch_size = batch_size or settings.USERS_PURGE_BATCH_SIZE
+        self.grace_period = (
+            settings.USERS_PURGE_GRACE_PERIOD
+            if grace_period is None
+            else grace_period
+        )
+
+    def purge_batch(self):
+        """
+        Removes one batch of users deleted before the grace period
+        Returns: the number of users removed
+        """
+        cutoff = timezone.now() - datetime.timedelta(seconds=self.grace_period)
+        with transaction.atomic():
+            ids = list(
+                UserModel.objects.select_for_update(skip_locked=True)
+                .filter(deleted_at__lte=cutoff)
+                .order_by('deleted_at')
+                .values_list('pk', flat=True)[: self.batch_size]
+            )
+            if ids:
+                UserModel.objects.filter(pk__in=ids).delete()
+        return len(ids)
+
+    def purge(self):
+        """
+        Removes batches until no deleted user is due
+        Returns: the number of users removed
+        """
+        total = 0
+        while True:
+            count = self.purge_batch()
+            total += count
+            if count < self.batch_size:
+                return total
+
+
+class BulkUserOperations:
+    """
+    Batch create, update and delete of users for admins
+
+    Rows are validated without queries, uniqueness is checked with one IN
+    query per field for the whole batch, passwords are hashed in parallel
+    on the hashing pool and rows are written in chunks inside one
+    transaction. Invalid rows are reported by index and the valid ones
+    are still written. Bulk writes send no model signals, so their work
+    is done here once for the whole batch.
+    """
+
+    unique_fields = ('username', 'email')
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or settings.BULK_USERS_CHUNK_SIZE
+
+    def create_users(self, rows):
+        """
+        Creates users, rows without a password get an unusable one
+        Parameters: rows  (list of user dicts)
+        Returns: {'created': [{'index', 'id'}], 'errors': [...]}
+        """
+        valid, errors = self.validate_rows(
+            serializers.BulkUserCreateSerializer(), rows
+        )
+        valid = self.check_unique(valid, errors)
+        self.hash_passwords(valid)
+
+        users = self.build_users(valid)
+        with transaction.atomic():
+            UserModel.objects.bulk_create(users, batch_size=self.chunk_size)
+        # MySQL does not return the primary keys of bulk inserts
+        ids = {}
+        for start in range(0, len(users), self.chunk_size):
+            stop = start + self.chunk_size
+            ids.update(
+                UserModel.objects.filter(
+                    username__in=[user.username for user in users[start:stop]]
+                ).values_list('username', 'pk')
+            )
+        self.add_identities(users)
+        return {
+            'created': [
+                {'index': index, 'id': ids[data['username']]}
+                for index, data in valid
+            ],
+            'errors': errors,
+        }
+
+    def import_users(self, rows, ignore_conflicts=False):
+        """
+        Inserts users from another system, keeping their password hashes
+
+        With ignore_conflicts the database skips the rows whose username or
+        email is taken instead of checking them first, which makes
+        re-importing the same rows harmless. The skipped rows are not
+        reported, they are left out of the rows written.
+        Parameters: rows  (list of user dicts), ignore_conflicts
+        Returns: (rows written, [row errors])
+        """
+        valid, errors = self.validate_rows(
+            serializers.BulkUserImportSerializer(), rows
+        )
+        if not ignore_conflicts:
+            valid = self.check_unique(valid, errors)
+        self.hash_passwords(valid, keep_encoded=True)
+
+        users = self.build_users(valid)
+        usernames = UserModel.objects.filter(
+            username__in=[user.username for user in users]
+        )
+        with transaction.atomic():
+            # bulk_create does not tell which rows the database skipped
+            existing = usernames.count() if ignore_conflicts else 0
+            UserModel.objects.bulk_create(
+                users,
+                batch_size=self.chunk_size,
+                ignore_conflicts=ignore_conflicts,
+            )
+            written = (
+                usernames.count() - existing
+                if ignore_conflicts
+                else len(users)
+            )
+        self.add_identities(users)
+        return written, errors
+
+    def update_users(self, rows):
+        """
+        Updates the given fields of the users named by `id`
+        Parameters: rows  (list of user dicts with an id)
+        Returns: {'updated': [{'index', 'id'}], 'errors': [...]}
+        """
+        valid, errors = self.validate_rows(
+            serializers.BulkUserUpdateSerializer(partial=True), rows
+        )
+        existing = (
+            UserModel.objects.filter(deleted_at__isnull=True)
+            .only('pk')
+            .in_bulk([data['id'] for _, data in valid if 'id' in data])
+        )
+        found, seen = [], set()
+        for index, data in valid:
+            user_id = data.get('id')
+            if user_id is None:
+                errors.append(
+                    self.row_error(index, 'id', 'This field is required.')
+                )
+            elif user_id not in existing:
+                errors.append(self.row_error(index, 'id', 'User not found.'))
+            elif user_id in seen:
+                errors.append(
+                    self.row_error(index, 'id', 'Duplicate user in batch.')
+                )
+            else:
+                seen.add(user_id)
+                found.append((index, data))
+        valid = self.check_unique(found, errors)
+        self.hash_passwords(valid)
+
+        updated, groups = [], {}
+        with transaction.atomic():
+            # Read again under lock, so a save committed since the rows
+            # were checked is kept and a concurrent one waits for this
+            users = (
+                UserModel.objects.select_for_update()
+                .filter(deleted_at__isnull=True)
+                .in_bulk([data['id'] for _, data in valid])
+            )
+            for index, data in valid:
+                user = users.get(data.pop('id'))
+                if user is None:
+                    errors.append(
+                        self.row_error(index, 'id', 'User not found.')
+                    )
+                    continue
+                if 'email' in data:
+                    # Same rule as UserSerializer.update
+                    data['email_verified'] = False
+                for field, value in data.items():
+                    setattr(user, field, value)
+                user.version += 1
+                # Every row writes only the fields it sent
+                groups.setdefault(frozenset(data), []).append(user)
+                updated.append((index, user))
+            for fields, group in groups.items():
+                UserModel.objects.bulk_update(
+                    group, [*fields, 'version'], batch_size=self.chunk_size
+                )
+            versions = [(user.pk, user.version) for _, user in updated]
+            transaction.on_commit(lambda: self.publish_versions(versions))
+        users = [user for _, user in updated]
+        invalidate_user_tokens(
+            *(user.pk for user in users), versions=dict(versions)
+        )
+        self.add_identities(users)
+        return {
+            'updated': [
+                {'index': index, 'id': user.pk} for index, user in updated
+            ],
+            'errors': errors,
+        }
+
+    def delete_users(self, ids):
+        """
+        Deactivates and tombstones users and revokes their tokens, the
+        purge worker removes the rows later
+        Parameters: ids  (list of user ids)
+        Returns: {'deleted': [ids], 'errors': [...]}
+        """
+        existing = set()
+        for start in range(0, len(ids), self.chunk_size):
+            stop = start + self.chunk_size
+            existing.update(
+                UserModel.objects.filter(
+                    pk__in=ids[start:stop],
+                    deleted_at__isnull=True,
+                ).values_list('pk', flat=True)
+            )
+        deleted = [
+            user_id for user_id in dict.fromkeys(ids) if user_id in existing
+        ]
+        errors = [
+            self.row_error(index, 'id', 'User not found.')
+            for index, user_id in enumerate(ids)
+            if user_id not in existing
+        ]
+
+        deleted_at = timezone.now()
+        versions = {}
+        with transaction.atomic():
+            for start in range(0, len(deleted), self.chunk_size):
+                stop = start + self.chunk_size
+                chunk = UserModel.objects.filter(pk__in=deleted[start:stop])
+                chunk.update(
+                    is_active=False,
+                    deleted_at=deleted_at,
+                    version=F('version') + 1,
+                )
+                versions.update(chunk.values_list('pk', 'version'))
+        invalidate_user_tokens(*deleted, versions=versions)
+        revocation_list = get_revocation_list()
+        for user_id in deleted:
+            revocation_list.revoke_user(user_id)
+        return {'deleted': deleted, 'errors': errors}
+
+    def validate_rows(self, serializer, rows):
+        """
+        Runs the row serializer on every row
+        Returns: ([(index, validated_data)], [row errors])
+        """
+        valid, errors = [], []
+        for index, row in enumerate(rows):
+            try:
+                valid.append((index, serializer.run_validation(row)))
+            except SerializerValidationError as e:
+                errors.append({'index': index, 'errors': e.detail})
+        return valid, errors
+
+    def check_unique(self, valid, errors):
+        """
+        Drops the rows whose username or email is taken, case-insensitive,
+        by another user or by an earlier row of the batch
+        Returns: the remaining rows
+        """
+        taken = {}
+        for field in self.unique_fields:
+            values = {
+                data[field].lower() for _, data in valid if data.get(field)
+            }
+            taken[field] = {}
+            values = list(values)
+            for start in range(0, len(values), self.chunk_size):
+                stop = start + self.chunk_size
+                taken[field].update(
+                    UserModel.objects.annotate(lowered=Lower(field))
+                    .filter(lowered__in=values[start:stop])
+                    .values_list('lowered', 'pk')
+                )
+
+        remaining = []
+        for index, data in valid:
+            row_errors = {}
+            for field in self.unique_fields:
+                value = data.get(field)
+                if not value:
+                    continue
+                owner = taken[field].get(value.lower(), data.get('id'))
+                if owner != data.get('id'):
+                    row_errors[field] = [
+                        f'A user with that {field} already exists.'
+                    ]
+            if row_errors:
+                errors.append({'index': index, 'errors': row_errors})
+                continue
+            for field in self.unique_fields:
+                if data.get(field):
+                    # Later rows of the batch must not take the value
+                    taken[field][data[field].lower()] = data.get('id', index)
+            remaining.append((index, data))
+        errors.sort(key=lambda error: error['index'])
+        return remaining
+
+    def hash_passwords(self, valid, keep_encoded=False):
+        """
+        Hashes the raw passwords of the rows on the hashing pool, with
+        keep_encoded the passwords that already are hashes are kept
+        """
+        rows = [
+            data
+            for _, data in valid
+            if data.get('password')
+            and not (keep_encoded and hashing.is_encoded(data['password']))
+        ]
+        hashes = hashing.make_passwords(row['password'] for row in rows)
+        for row, encoded in zip(rows, hashes):
+            row['password'] = encoded
+
+    @staticmethod
+    def build_users(valid):
+        users = [UserModel(**data) for _, data in valid]
+        for user in users:
+            if not user.password:
+                user.password = make_password(None)
+        return users
+
+    @staticmethod
+    def add_identities(users):
+        # Bulk writes skip the post_save signal that feeds the filter
+        get_identity_filter().add(
+            *(value for user in users for value in (user.username, user.email))
+        )
+
+    @staticmethod
+    def publish_versions(versions):
+        profile_versions = ProfileVersionOperations()
+        for user_id, version in versions:
+            profile_versions.set_version(user_id, version)
+
+    @staticmethod
+    def row_error(index, field, message):
+        return {'index': index, 'errors': {field: [message]}}
+
+
+class ProfileVersionOperations:
+    """
+    Per-user profile version, read from a Redis mirror of UserModel.version
+    """
+
+    redis_key = 'user-profile-version:{user_id}'
+    timeout = 24 * 60 * 60
+
+    def get_version(self, user_id):
+        """
+        Returns the current profile version of the user
+        Parameters: user_id
+        """
+        client = tools.get_redis_client()
+        key = self.redis_key.format(user_id=user_id)
+        if client is not None:
+            try:
+                version = client.get(key)
+            except RedisError:
+                logger.exception('Failed to read profile version')
+                client = None
+            else:
+                if version is not None:
+                    return int(version)
+
+        version = (
+            UserModel.objects.filter(pk=user_id)
+            .values_list('version', flat=True)
+            .first()
+        )
+        if client is not None and version is not None:
+            # NX: never overwrite a newer version stored by a writer
+            try:
+                client.set(key, version, ex=self.timeout, nx=True)
+            except RedisError:
+                logger.exception('Failed to store profile version')
+        return version
+
+    @staticmethod
+    def etag(user_id, version):
+        """
+        Returns the strong ETag of a profile version
+        """
+        return f'"{user_id}-{version}"'
+
+    def get_etag(self, user_id):
+        """
+        Returns the ETag of the current profile, or None for a missing user
+        Parameters: user_id
+        """
+        version = self.get_version(user_id)
+        if version is None:
+            return None
+        return self.etag(user_id, version)
+
+    def set_version(self, user_id, version):
+        """
+        Stores a new profile version, after the update that produced it
+        Parameters: user_id, version
+        """
+        client = tools.get_redis_client()
+        if client is None:
+            return
+        try:
+            client.set(
+                self.redis_key.format(user_id=user_id),
+                version,
+                ex=self.timeout,
+            )
+        except RedisError:
+            logger.exception('Failed to store profile version')
+            # A stale mirror would accept old snapshots, drop it instead
+            try:
+                client.delete(self.redis_key.format(user_id=user_id))
+            except RedisError:
+                pass
+
+    def get_profile_from_token(self, token):
+        """
+        Returns the profile snapshot of an access token, or None when the
+        token has no snapshot or the user was updated after it was issued
+        Parameters: token  (validated simplejwt token)
+        """
+        if not isinstance(token, JWTToken) or PROFILE_CLAIM not in token:
+            return None
+        user_id = token[api_settings.USER_ID_CLAIM]
+        if token.get(PROFILE_VERSION_CLAIM) != self.get_version(user_id):
+            return None
+        profile = token[PROFILE_CLAIM]
+        return {
+            'id': user_id,
+            **{field: profile.get(field) for field in PROFILE_CLAIM_FIELDS},
+        }
+
+
+class TokenOperations:
+    cache_key = 'auth-token:{user_id}'
+
+    def get_or_create_token(self, user):
+        """
+        Returns the DRF token key of the user, creating it on first login
+
+        Repeat logins are served from the cache, a cache miss costs one
+        indexed read. A missing token is written with INSERT IGNORE, so
+        concurrent first logins never fail on the unique user column.
+        Parameters: user
+        """
+        cache_key = self.cache_key.format(user_id=user.pk)
+        key = cache.get(cache_key)
+        if key is not None:
+            return key
+
+        key = self._get_token_key(user.pk)
+        if key is None:
+            Token.objects.bulk_create(
+                [Token(key=Token.generate_key(), user_id=user.pk)],
+                ignore_conflicts=True,
+            )
+            # Read back, a concurrent login may have inserted its own key
+            key = self._get_token_key(user.pk)
+
+        cache.set(cache_key, key, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return key
+
+    def invalidate_token(self, user_id):
+        """
+        Drops the cached token key of the user
+        Parameters: user_id
+        """
+        cache.delete(self.cache_key.format(user_id=user_id))
+
+    def _get_token_key(self, user_id):
+        return (
+            Token.objects.filter(user_id=user_id)
+            .values_list('key', flat=True)
+            .first()
+        )
+
+
+class UserLookupOperations:
+    """
+    Resolves user ids and usernames to public profiles in one query
+    """
+
+    public_fields = ('id', 'username', 'first_name', 'last_name')
+
+    def lookup(self, ids=(), usernames=()):
+        """
+        Returns the public profiles of the users found, by id
+        Parameters: ids, usernames
+        """
+        rows = (
+            UserModel.objects.filter(Q(pk__in=ids) | Q(username__in=usernames))
+            .filter(deleted_at__isnull=True)
+            .values_list(*self.public_fields)
+        )
+        return {row[0]: dict(zip(self.public_fields, row)) for row in rows}
+
+
+class _Echo:
+    """
+    File-like object whose write returns the value, for csv.writer
+    """
+
+    def write(self, value):
+        return value
+
+
+class UserExportOperations:
+    """
+    Streams every user as NDJSON or CSV, in primary key order
+
+    Users are read in keyset chunks (pk greater than the last one sent),
+    so every query is an index range scan and memory stays flat whatever
+    the size of the table. An export is resumed by passing the id of the
+    last user received as `after`. Deleted users waiting for the purge
+    are left out.
+    """
+
+    # The id leads, it is the keyset cursor
+    fields = (
+        'id',
+        *(
+            field
+            for field in serializers.UserProjectionSerializer.fields
+            if field != 'id'
+        ),
+    )
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or settings.USERS_EXPORT_CHUNK_SIZE
+
+    def iter_rows(self, after=0):
+        """
+        Yields the column values of every user with a pk above `after`
+        """
+        while True:
+            rows = (
+                UserModel.objects.filter(pk__gt=after, deleted_at__isnull=True)
+                .order_by('pk')
+                .values_list(*self.fields)[: self.chunk_size]
+            )
+            count = 0
+            for row in rows.iterator(chunk_size=self.chunk_size):
+                count += 1
+                yield row
+            if count < self.chunk_size:
+                return
+            after = row[0]
+
+    def export(self, output='ndjson', after=0):
+        """
+        Yields the encoded lines of the export
+        Parameters: output  (ndjson or csv), after  (last user id received)
+        """
+        rows = self.iter_rows(after)
+        if output == 'csv':
+            writer = csv.writer(_Echo())
+            # A resumed export continues a file that has the header
+            if not after:
+                yield writer.writerow(self.fields)
+            for row in rows:
+                yield writer.writerow(row)
+        else:
+            for row in rows:
+                yield orjson.dumps(dict(zip(self.fields, row))) + b'\n'
+
+
+class AvailabilityOperations:
+    def check_availability(self, **identities):
+        """
+        Checks whether usernames or emails are still free, case-insensitively
+        Parameters: identities  (username and/or email to check)
+        Returns: {field: is_available}
+        """
+        identity_filter = get_identity_filter()
+        results = {}
+        for field, value in identities.items():
+            if not identity_filter.might_exist(value):
+                results[field] = True
+                continue
+            results[field] = (
+                not UserModel._default_manager.alias(lowered=Lower(field))
+                .filter(lowered=value.lower())
+                .exists()
+            )
+        return results
+
+
+class IntrospectionOperations:
+    inactive = {'active': False, 'user_id': None, 'claims': None}
+
+    def introspect(self, tokens):
+        """
+        Returns the state of each token, in the order given
+
+        DRF token keys are resolved with a single IN query, JWTs are
+        verified once per distinct token.
+        Parameters: tokens  (list of DRF token keys or JWTs)
+        """
+        results = {}
+        jwts = {token for token in tokens if token.count('.') == 2}
+        for token in jwts:
+            results[token] = self._introspect_jwt(token)
+
+        keys = set(tokens) - jwts
+        if keys:
+            for token in (
+                Token.objects.filter(key__in=keys)
+                .select_related('user')
+                .only('key', 'user', 'user__is_active', 'user__username')
+            ):
+                results[token.key] = {
+                    'active': token.user.is_active,
+                    'user_id': token.user_id,
+                    'claims': {'username': token.user.username},
+                }
+
+        return [
+            {
+                'token_type': 'jwt' if token in jwts else 'token',
+                **results.get(token, self.inactive),
+            }
+            for token in tokens
+        ]
+
+    def _introspect_jwt(self, token):
+        try:
+            access_token = AccessToken(token)
+        except TokenError:
+            return self.inactive
+        if get_revocation_list().is_access_revoked(access_token):
+            return self.inactive
+        return {
+            'active': True,
+            'user_id': access_token.get(api_settings.USER_ID_CLAIM),
+            'claims': access_token.payload,
+        }
+
+
+class OTPUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Email verification is unavailable, try again later.'
+    default_code = 'otp_unavailable'
+
+
+class OTPStore:
+    """
+    One-time passwords by user id, in Redis
+
+    Codes expire with their key after `ttl` seconds. Every check counts
+    against `max_attempts` with an atomic counter, the code is dropped
+    once they are used up, and a successful check deletes the code so it
+    works only once.
+    """
+
+    code_key = 'otp:{user_id}'
+    attempts_key = 'otp-attempts:{user_id}'
+
+    def __init__(self, ttl=None, max_attempts=None):
+        self.ttl = ttl or settings.OTP_TTL
+        self.max_attempts = max_attempts or settings.OTP_MAX_ATTEMPTS
+
+    def store(self, user_id, otp):
+        """
+        Stores a new code for the user, replacing any previous one
+        """
+        client = self._get_redis_client()
+        try:
+            client.set(self.code_key.format(user_id=user_id), otp, ex=self.ttl)
+            client.delete(self.attempts_key.format(user_id=user_id))
+        except RedisError:
+            logger.exception('Failed to store OTP')
+            raise OTPUnavailable()
+
+    def verify(self, user_id, otp):
+        """
+        Checks a submitted code, consuming it on success
+        Returns: whether the code is correct
+        """
+        client = self._get_redis_client()
+        code_key = self.code_key.format(user_id=user_id)
+        attempts_key = self.attempts_key.format(user_id=user_id)
+        try:
+            attempts = client.incr(attempts_key)
+            if attempts == 1:
+                client.expire(attempts_key, self.ttl)
+            if attempts > self.max_attempts:
+                client.delete(code_key, attempts_key)
+                return False
+            stored = client.get(code_key)
+            if stored is None or not hmac.compare_digest(stored, otp.encode()):
+                return False
+            # Of concurrent checks with the right code only one deletes it
+            if not client.delete(code_key):
+                return False
+            client.delete(attempts_key)
+        except RedisError:
+            logger.exception('Failed to verify OTP')
+            raise OTPUnavailable()
+        return True
+
+    def _get_redis_client(self):
+        client = tools.get_redis_client()
+        if client is None:
+            raise OTPUnavailable()
+        return client
+
+
 class EmailVerificationOperations:
     # Generate OTP
     def generate_otp(self, length=6):
-        return ''.join(random.choices(string.digits, k=length))
+        return ''.join(secrets.choice(string.digits) for _ in range(length))
 
     # Send OTP via Email
-    def send_otp_to_email(self, email):
-        otp = self.generate_otp()
+    def send_otp_to_email(self, email, otp=None):
+        otp = otp or self.generate_otp()
 
-        # Simulate sending OTP to the user's email
-        send_mail(
+        # Sent by the mail worker, the request only writes the outbox row
+        enqueue_mail(
             'OTP for Email Verification',
             f'Your OTP is: {otp}',
             settings.EMAIL_USER_HOST,
             [email],
-            fail_silently=False,
         )
 
         return otp
@@ -0,0 +1,169 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from connector.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMAIL_OUTBOX_SETTINGS = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 30,
+    'LEASE': 300,
+    'INTERVAL': 1,
+}
+
+
+def get_outbox_settings():
+    return {
+        **DEFAULT_EMAIL_OUTBOX_SETTINGS,
+        **getattr(settings, 'EMAIL_OUTBOX', {}),
+    }
+
+
+def enqueue_mail(subject, body, from_email, recipients):
+    """
+    Writes an email to the outbox, in the transaction of the caller
+    """
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email,
+        recipients=list(recipients),
+    )
+
+
+class OutboxSender:
+    """
+    Sends the outbox in batches over one reused SMTP connection
+
+    A batch is claimed by pushing its next attempt `lease` seconds ahead
+    in a short transaction, so several workers can drain the outbox and a
+    worker that dies mid-batch only delays its messages. Sent messages are
+    deleted, failed ones are retried with exponential backoff until they
+    have used `max_attempts`.
+    """
+
+    def __init__(self, batch_size, max_attempts, backoff, lease):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.connection = None
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            messages = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[: self.batch_size]
+            )
+            if messages:
+                EmailOutbox.objects.filter(
+                    pk__in=[message.pk for message in messages]
+                ).update(
+                    next_attempt_at=now
+                    + datetime.timedelta(seconds=self.lease)
+                )
+        return messages
+
+    def send_batch(self):
+        """
+        Sends one batch of due messages
+        Returns: (sent, failed)
+        """
+        messages = self.claim()
+        if not messages:
+            return 0, 0
+
+        sent, failed = [], []
+        for index, message in enumerate(messages):
+            try:
+                connection = self.get_connection()
+            except Exception as e:
+                logger.exception('Mail server unavailable')
+                failed.extend(
+                    (message, repr(e)) for message in messages[index:]
+                )
+                break
+            try:
+                connection.send_messages(
+                    [
+                        EmailMessage(
+                            message.subject,
+                            message.body,
+                            message.from_email,
+                            message.recipients,
+                        )
+                    ]
+                )
+            except Exception as e:
+                logger.warning('Failed to send email %s', message.pk)
+                failed.append((message, repr(e)))
+                # The connection may be broken, the next message reopens it
+                self.close()
+            else:
+                sent.append(message.pk)
+
+        EmailOutbox.objects.filter(pk__in=sent).delete()
+        for message, error in failed:
+            self.retry_later(message, error)
+        return len(sent), len(failed)
+
+    def retry_later(self, message, error):
+        attempts = message.attempts + 1
+        next_attempt_at = None
+        if attempts < self.max_attempts:
+            next_attempt_at = timezone.now() + datetime.timedelta(
+                seconds=self.backoff * 2 ** (attempts - 1)
+            )
+        else:
+            logger.error(
+                'Giving up on email %s after %s attempts', message.pk, attempts
+            )
+        EmailOutbox.objects.filter(pk=message.pk).update(
+            attempts=attempts,
+            next_attempt_at=next_attempt_at,
+            last_error=error,
+        )
+
+    def queue_depth(self):
+        """
+        Returns: (messages waiting, messages given up on)
+        """
+        pending = EmailOutbox.objects.filter(
+            next_attempt_at__isnull=False
+        ).count()
+        dead = EmailOutbox.objects.filter(next_attempt_at__isnull=True).count()
+        return pending, dead
+
+    def get_connection(self):
+        if self.connection is None:
+            connection = get_connection(timeout=settings.EMAIL_TIMEOUT)
+            connection.open()
+            self.connection = connection
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+def get_outbox_sender():
+    config = get_outbox_settings()
+    return OutboxSender(
+        batch_size=config['BATCH_SIZE'],
+        max_attempts=config['MAX_ATTEMPTS'],
+        backoff=config['BACKOFF'],
+        lease=config['LEASE'],
+    )
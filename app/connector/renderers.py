@@ -0,0 +1,22 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer built on orjson
+
+    The output matches the compact, UTF-8 JSONRenderer defaults, any
+    requested indent becomes two spaces. Types orjson cannot serialize,
+    such as sets, lazy strings and Decimals, go through the DRF encoder.
+    """
+
+    default = staticmethod(JSONRenderer.encoder_class().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        option = orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=self.default, option=option)
@@ -0,0 +1,297 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.settings import api_settings
+
+from connector.tokens import FAMILY_CLAIM
+from connector.utils import tools
+from connector.utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_REVOCATION_SETTINGS = {
+    'BLOOM_CAPACITY': 100000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'REBUILD_INTERVAL': 60,
+    'ACCESS_FAIL_OPEN': True,
+}
+
+
+class RevocationUnavailable(Exception):
+    """
+    Raised when Redis cannot tell whether a token is revoked
+    """
+
+
+class RevocationList:
+    """
+    Revoked JWTs, as a Redis sorted set of token ids scored by expiry
+
+    A token is revoked by its `jti`, or with every token of its refresh
+    family by a `family:<id>` entry. Each worker keeps the entries in a
+    Bloom filter, so the common not-revoked answer needs no network call
+    and only possible hits are confirmed in Redis. The filter is rebuilt
+    from Redis every `rebuild_interval` seconds, which also drops expired
+    entries, and new revocations are broadcast so every worker adds them
+    at once.
+
+    Without Redis nothing is ever revoked. When the configured Redis
+    fails, refresh tokens are rejected and access tokens are accepted
+    unchecked only with `access_fail_open`.
+    """
+
+    redis_key = 'revoked-jti'
+    used_key = 'refresh-used:{jti}'
+    families_key = 'user-token-families:{user_id}'
+    channel = 'revoked-jti'
+
+    def __init__(
+        self, capacity, error_rate, rebuild_interval, access_fail_open=True
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.access_fail_open = access_fail_open
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._added_during_rebuild = None
+
+    def is_revoked(self, token):
+        """
+        Checks the token and its refresh family against the revocation list
+        Raises: RevocationUnavailable when Redis fails
+        """
+        client = self._get_redis_client()
+        if client is None:
+            return False
+        self._refresh_bloom(client)
+        if self.built_at is None:
+            raise RevocationUnavailable('The revocation list is not loaded')
+
+        entries = [
+            entry for entry in self.entries(token) if entry in self.bloom
+        ]
+        if not entries:
+            return False
+        now = time.time()
+        try:
+            for entry in entries:
+                score = client.zscore(self.redis_key, entry)
+                if score is not None and score > now:
+                    return True
+        except RedisError as e:
+            logger.exception('Failed to check token revocation')
+            raise RevocationUnavailable() from e
+        return False
+
+    def is_access_revoked(self, token):
+        """
+        is_revoked for access tokens, accepted unchecked when Redis fails
+        if access_fail_open is set
+        """
+        try:
+            return self.is_revoked(token)
+        except RevocationUnavailable:
+            if not self.access_fail_open:
+                return True
+            logger.error(
+                'Accepting access token %s without a revocation check',
+                token.get(api_settings.JTI_CLAIM),
+            )
+            return False
+
+    def revoke_token(self, token):
+        self._revoke(token[api_settings.JTI_CLAIM], token['exp'])
+
+    def revoke_family(self, family):
+        """
+        Revokes every access and refresh token issued from one login
+        """
+        self._revoke(
+            f'family:{family}',
+            time.time() + api_settings.REFRESH_TOKEN_LIFETIME.total_seconds(),
+        )
+
+    def register_family(self, user_id, family):
+        """
+        Remembers a new refresh family of the user for revoke_user
+        """
+        client = self._get_redis_client()
+        if client is None:
+            return
+        key = self.families_key.format(user_id=user_id)
+        try:
+            client.sadd(key, family)
+            client.expire(key, api_settings.REFRESH_TOKEN_LIFETIME)
+        except RedisError:
+            logger.exception('Failed to register token family')
+
+    def revoke_user(self, user_id):
+        """
+        Revokes every token issued to the user
+        """
+        client = self._get_redis_client()
+        if client is None:
+            return
+        key = self.families_key.format(user_id=user_id)
+        try:
+            families = client.smembers(key)
+        except RedisError:
+            logger.exception('Failed to read token families')
+            return
+        for family in families:
+            self.revoke_family(family.decode())
+        try:
+            client.delete(key)
+        except RedisError:
+            logger.exception('Failed to delete token families')
+
+    def mark_used(self, token):
+        """
+        Records the use of a refresh token
+        Returns: False when it had been used already
+        Raises: RevocationUnavailable when Redis fails
+        """
+        client = self._get_redis_client()
+        if client is None:
+            return True
+        expires_in = max(1, int(token['exp'] - time.time()) + 1)
+        try:
+            return bool(
+                client.set(
+                    self.used_key.format(jti=token[api_settings.JTI_CLAIM]),
+                    1,
+                    ex=expires_in,
+                    nx=True,
+                )
+            )
+        except RedisError as e:
+            logger.exception('Failed to record refresh token use')
+            raise RevocationUnavailable() from e
+
+    @staticmethod
+    def entries(token):
+        entries = [token[api_settings.JTI_CLAIM]]
+        family = token.get(FAMILY_CLAIM)
+        if family:
+            entries.append(f'family:{family}')
+        return entries
+
+    def rebuild(self):
+        """
+        Replaces the Bloom filter with one built from the entries in Redis
+        """
+        client = self._get_redis_client()
+        if client is None:
+            return
+        with self._lock:
+            self._added_during_rebuild = []
+        try:
+            client.zremrangebyscore(self.redis_key, '-inf', time.time())
+            count = client.zcard(self.redis_key)
+            bloom = BloomFilter(max(self.capacity, 2 * count), self.error_rate)
+            for entry, _ in client.zscan_iter(self.redis_key, count=1000):
+                bloom.add(entry.decode())
+        except RedisError:
+            logger.exception('Failed to rebuild the revocation filter')
+            with self._lock:
+                self._added_during_rebuild = None
+            return
+        with self._lock:
+            # Keep what was broadcast while the set was being read
+            for entry in self._added_during_rebuild:
+                bloom.add(entry)
+            self._added_during_rebuild = None
+            self.bloom = bloom
+            self.built_at = time.monotonic()
+
+    def _refresh_bloom(self, client):
+        if self.built_at is None:
+            # Nothing can be answered before the first build
+            with self._rebuild_lock:
+                if self.built_at is None:
+                    self.rebuild()
+            return
+        if time.monotonic() - self.built_at < self.rebuild_interval:
+            return
+        if self._rebuild_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._rebuild_in_background, daemon=True
+            ).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def _revoke(self, entry, expires_at):
+        self._add(entry)
+        client = self._get_redis_client()
+        if client is None:
+            return
+        try:
+            client.zadd(self.redis_key, {entry: expires_at})
+            client.publish(self.channel, entry)
+        except RedisError:
+            logger.exception('Failed to revoke token')
+
+    def _add(self, entry):
+        with self._lock:
+            self.bloom.add(entry)
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild.append(entry)
+
+    def _on_revocation(self, message):
+        entry = message['data']
+        if isinstance(entry, bytes):
+            entry = entry.decode()
+        self._add(entry)
+
+    def _on_subscribed(self, renewed):
+        # Revocations broadcast while the subscription was down were lost
+        if (
+            renewed
+            and self.built_at is not None
+            and self._rebuild_lock.acquire(blocking=False)
+        ):
+            threading.Thread(
+                target=self._rebuild_in_background, daemon=True
+            ).start()
+
+    def _get_redis_client(self):
+        client = tools.get_redis_client()
+        if client is not None:
+            tools.subscribe(
+                self.channel,
+                self._on_revocation,
+                on_subscribe=self._on_subscribed,
+            )
+        return client
+
+
+_revocation_list = None
+_revocation_list_lock = threading.Lock()
+
+
+def get_revocation_list():
+    global _revocation_list
+    if _revocation_list is None:
+        with _revocation_list_lock:
+            if _revocation_list is None:
+                config = {
+                    **DEFAULT_TOKEN_REVOCATION_SETTINGS,
+                    **getattr(settings, 'TOKEN_REVOCATION', {}),
+                }
+                _revocation_list = RevocationList(
+                    capacity=config['BLOOM_CAPACITY'],
+                    error_rate=config['BLOOM_ERROR_RATE'],
+                    rebuild_interval=config['REBUILD_INTERVAL'],
+                    access_fail_open=config['ACCESS_FAIL_OPEN'],
+                )
+    return _revocation_list
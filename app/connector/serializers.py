@@ -1,10 +1,18 @@
+import operator
 import re
 
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.contrib.auth.hashers import make_password
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import TokenError
 
+from connector import hashing
 from connector.models import UserModel
+from connector.revocation import RevocationUnavailable, get_revocation_list
+from connector.tokens import FAMILY_CLAIM, RefreshToken
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -66,11 +74,15 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         # Hash the password before saving
-        validated_data['password'] = make_password(validated_data['password'])
+        validated_data['password'] = hashing.make_password(
+            validated_data['password']
+        )
         return super().create(validated_data)
 
 
 class UserSerializer(serializers.ModelSerializer):
+    unique_fields = ('username', 'email')
+
     class Meta:
         model = UserModel
         # fields = '__all__'
@@ -82,12 +94,249 @@ class UserSerializer(serializers.ModelSerializer):
             'is_superuser',
             'last_login',
             'date_joined',
+            'deleted_at',
         ]
+        # Driven by the model on every save, clients send If-Match instead
+        read_only_fields = ('version',)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        data = getattr(self, 'initial_data', None)
+        if isinstance(self.instance, UserModel) and data is not None:
+            # An unchanged username or email needs no uniqueness query
+            for name in self.unique_fields:
+                if name in data and data[name] == getattr(self.instance, name):
+                    fields[name].validators = [
+                        validator
+                        for validator in fields[name].validators
+                        if not isinstance(validator, UniqueValidator)
+                    ]
+        return fields
 
     def update(self, instance, validated_data):
+        # Write only the columns that change, or nothing at all
+        changed = {
+            name: value
+            for name, value in validated_data.items()
+            if getattr(instance, name) != value
+        }
+        if not changed:
+            return instance
+
         # Check if email is being updated
-        if 'email' in validated_data:
+        if 'email' in changed:
             # Set email_verified to False if email is updated
-            validated_data['email_verified'] = False
+            changed['email_verified'] = False
+
+        for name, value in changed.items():
+            setattr(instance, name, value)
+        instance.save(update_fields=changed)
+        return instance
+
+
+class BulkRowSerializerMixin:
+    """
+    Row serializer of the bulk endpoints
+
+    One instance validates every row with run_validation, uniqueness is
+    checked for the whole batch by BulkUserOperations instead of one
+    query per row and field.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for field in fields.values():
+            field.validators = [
+                validator
+                for validator in field.validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+        return fields
+
+
+class BulkUserCreateSerializer(
+    BulkRowSerializerMixin, UserRegistrationSerializer
+):
+    # Users without a password get an unusable one
+    password = serializers.CharField(write_only=True, required=False)
+
+    class Meta(UserRegistrationSerializer.Meta):
+        fields = (
+            'username',
+            'email',
+            'password',
+            'first_name',
+            'last_name',
+            'second_last_name',
+            'is_active',
+        )
+
+
+class BulkUserImportSerializer(BulkUserCreateSerializer):
+    """
+    Row serializer of the user import, passwords may be legacy hashes
+    """
+
+    def validate_password(self, value):
+        if hashing.is_encoded(value):
+            return value
+        # Hashing it would make the legacy hash itself the password
+        if hashing.looks_encoded(value):
+            raise serializers.ValidationError(
+                'Password hash of an unknown algorithm, add its hasher to '
+                'PASSWORD_HASHERS.'
+            )
+        return super().validate_password(value)
+
+
+class BulkUserUpdateSerializer(
+    BulkRowSerializerMixin, UserRegistrationSerializer
+):
+    id = serializers.IntegerField()
+
+    class Meta(UserRegistrationSerializer.Meta):
+        fields = (
+            'id',
+            'username',
+            'email',
+            'password',
+            'first_name',
+            'last_name',
+            'second_last_name',
+            'email_verified',
+            'is_active',
+        )
+        read_only_fields = ()
+
+
+class BulkUsersSerializer(serializers.Serializer):
+    users = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=settings.BULK_USERS_MAX_SIZE,
+    )
+
+
+class BulkUserDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.BULK_USERS_MAX_SIZE,
+    )
+
+
+class UserProjectionSerializer:
+    """
+    Read-only UserSerializer for responses, without DRF field machinery
+
+    The fields are the UserSerializer fields minus the password hash,
+    resolved once at import into a tuple and a single attrgetter.
+    """
+
+    fields = tuple(
+        field.attname
+        for field in UserModel._meta.concrete_fields
+        if field.name not in {*UserSerializer.Meta.exclude, 'password'}
+    )
+    _get_values = operator.attrgetter(*fields)
+
+    @classmethod
+    def to_representation(cls, user):
+        return dict(zip(cls.fields, cls._get_values(user)))
+
+
+class TokenIntrospectionSerializer(serializers.Serializer):
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.INTROSPECTION_BATCH_MAX_SIZE,
+    )
+
+
+class CommaSeparatedListField(serializers.ListField):
+    """
+    List field that also reads comma-separated query parameters
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [data]
+        data = [
+            item
+            for value in data
+            for item in (
+                value.split(',') if isinstance(value, str) else [value]
+            )
+            if item != ''
+        ]
+        return super().to_internal_value(data)
+
+
+class UserLookupSerializer(serializers.Serializer):
+    ids = CommaSeparatedListField(
+        child=serializers.IntegerField(min_value=1), required=False
+    )
+    usernames = CommaSeparatedListField(
+        child=serializers.CharField(max_length=50), required=False
+    )
+
+    def validate(self, data):
+        size = len(data.get('ids', ())) + len(data.get('usernames', ()))
+        if not size:
+            raise serializers.ValidationError('Provide ids or usernames')
+        if size > settings.USERS_LOOKUP_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Ensure there are no more than '
+                f'{settings.USERS_LOOKUP_MAX_SIZE} ids and usernames.'
+            )
+        return data
+
+
+class UserExportSerializer(serializers.Serializer):
+    # `format` is taken by DRF content negotiation
+    output = serializers.ChoiceField(
+        choices=('ndjson', 'csv'), default='ndjson'
+    )
+    after = serializers.IntegerField(min_value=0, default=0)
+
+
+class AvailabilitySerializer(serializers.Serializer):
+    username = serializers.CharField(required=False, max_length=50)
+    email = serializers.EmailField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError('Provide a username or an email')
+        return data
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Rotates the refresh token on every use
+
+    A refresh token presented a second time means it was copied, the
+    whole family is revoked so neither the thief nor the user can go on
+    with it. Without Redis to check that, no token is refreshed.
+    """
+
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        family = refresh.get(FAMILY_CLAIM)
+        if not family:
+            # Issued before refresh families, its reuse cannot be revoked
+            raise TokenError(_('Token has no family, log in again'))
+        revocation_list = get_revocation_list()
+        try:
+            if revocation_list.is_revoked(refresh):
+                raise TokenError(_('Token is revoked'))
+            if not revocation_list.mark_used(refresh):
+                revocation_list.revoke_family(family)
+                raise TokenError(_('Token was already used'))
+        except RevocationUnavailable:
+            raise TokenError(_('Token revocation is unavailable, try again'))
 
-        return super().update(instance, validated_data)
+        access = refresh.access_token
+        refresh.rotate()
+        return {'access': str(access), 'refresh': str(refresh)}
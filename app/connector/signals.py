@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from connector.authentication import invalidate_token, invalidate_user_tokens
+from connector.identities import get_identity_filter
+from connector.models import UserModel
+from connector.operations import ProfileVersionOperations, TokenOperations
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    TokenOperations().invalidate_token(instance.user_id)
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=UserModel)
+def user_saved(sender, instance, created, **kwargs):
+    if instance.stale:
+        # The row was at another version, nothing was written
+        return
+    get_identity_filter().add(instance.username, instance.email)
+    # Cached users go stale on any change, deactivation must revoke at once
+    if not created:
+        user_id, version = instance.pk, instance.version
+        invalidate_user_tokens(user_id, versions={user_id: version})
+
+        def on_commit():
+            # Requests may have cached the old row until the commit
+            invalidate_user_tokens(user_id, versions={user_id: version})
+            ProfileVersionOperations().set_version(user_id, version)
+
+        transaction.on_commit(on_commit)
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from connector import async_views
+from connector.models import UserModel
+
+
+# Pool threads open their own connections, rows must be committed
+class AsyncViewTest(TransactionTestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = UserModel.objects.create_user(
+            username='asyncuser',
+            password='Testpassword1!',
+            email='async@example.com',
+        )
+
+    def test_as_view_is_coroutine_function(self):
+        view = async_views.UserLoginView.as_view()
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        self.assertTrue(view.csrf_exempt)
+
+    def test_login(self):
+        view = async_views.UserLoginView.as_view()
+        request = self.factory.post(
+            '/api/login/',
+            {'username': 'asyncuser', 'password': 'Testpassword1!'},
+        )
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Access Token', response.data)
+
+    def test_invalid_login(self):
+        view = async_views.UserLoginView.as_view()
+        request = self.factory.post(
+            '/api/login/', {'username': 'asyncuser', 'password': 'wrong'}
+        )
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_user(self):
+        view = async_views.UserViewSet.as_view({'get': 'retrieve'})
+        request = self.factory.get('/api/user/')
+        force_authenticate(request, user=self.user)
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], 'asyncuser')
+
+    def test_method_not_allowed(self):
+        view = async_views.UserViewSet.as_view({'get': 'retrieve'})
+        request = self.factory.post('/api/user/')
+        force_authenticate(request, user=self.user)
+        response = async_to_sync(view)(request)
+        self.assertEqual(
+            response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+    def test_unauthenticated_retrieve(self):
+        view = async_views.UserViewSet.as_view({'get': 'retrieve'})
+        response = async_to_sync(view)(self.factory.get('/api/user/'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_run_in_thread(self):
+        caller = threading.get_ident()
+        thread = async_to_sync(async_views.run_in_thread)(threading.get_ident)
+        self.assertNotEqual(thread, caller)
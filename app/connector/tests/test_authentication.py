@@ -0,0 +1,117 @@
+from unittest.mock import patch
+
+from django.db import transaction
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from connector.authentication import (
+    CachedTokenAuthentication,
+    TokenCache,
+    get_token_cache,
+)
+from connector.models import UserModel
+from connector.operations import UserOperations
+from connector.utils.test_mocker import RedisMock
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        get_token_cache().local.clear()
+        get_token_cache().floors.clear()
+        self.authentication = CachedTokenAuthentication()
+        self.user = UserModel.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='Test1234!',
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def test_cached_token_skips_database(self):
+        user, token = self.authentication.authenticate_credentials(
+            self.token.key
+        )
+        self.assertEqual(user, self.user)
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(
+                self.token.key
+            )
+        self.assertEqual(user.username, 'testuser')
+        self.assertEqual(token.key, self.token.key)
+
+    def test_cached_user_defers_password(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        user, _ = self.authentication.authenticate_credentials(self.token.key)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertTrue(user.check_password('Test1234!'))
+
+    def test_deactivated_user_is_rejected(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_deactivated_in_transaction_is_rejected(self):
+        committed = UserModel.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.is_active = False
+                self.user.save()
+                # A request still reading the committed row caches it
+                get_token_cache().set(self.token.key, committed)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_deleted_token_is_rejected(self):
+        key = self.token.key
+        self.authentication.authenticate_credentials(key)
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(key)
+
+    def test_deleted_user_is_rejected(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        UserOperations().delete_user_record(self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+
+class TokenCacheRedisTest(TestCase):
+    def setUp(self):
+        self.redis = RedisMock()
+        patcher = patch(
+            'connector.authentication.tools.get_redis_client',
+            return_value=self.redis,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = UserModel.objects.create_user(
+            username='testuser', email='test@example.com'
+        )
+
+    def test_other_worker_reads_from_redis(self):
+        TokenCache(100, 5, 60).set('key', self.user)
+        with self.assertNumQueries(0):
+            user = TokenCache(100, 5, 60).get('key')
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, 'test@example.com')
+        self.assertEqual(user.date_joined, self.user.date_joined)
+
+    def test_invalidation_reaches_other_workers(self):
+        worker, other_worker = TokenCache(100, 5, 60), TokenCache(100, 5, 60)
+        worker.set('key', self.user)
+        self.assertIsNotNone(other_worker.get('key'))
+        worker.invalidate('key')
+        self.assertIsNone(other_worker.get('key'))
+
+    def test_older_version_is_not_cached_again(self):
+        worker, other_worker = TokenCache(100, 5, 60), TokenCache(100, 5, 60)
+        worker.invalidate('key', version=self.user.version + 1)
+        other_worker.set('key', self.user)
+        self.assertIsNone(TokenCache(100, 5, 60).get('key'))
+        self.assertIsNone(other_worker.get('key'))
+
+        self.user.version += 1
+        other_worker.set('key', self.user)
+        self.assertIsNotNone(TokenCache(100, 5, 60).get('key'))
@@ -0,0 +1,148 @@
+from unittest.mock import patch
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.test import TestCase, override_settings
+
+from connector.backends import HashingPoolModelBackend, UsernameOrEmailBackend
+from connector.identities import IdentityFilter
+from connector.models import UserModel
+from connector.utils.test_mocker import RedisMock
+
+
+class HashingPoolModelBackendTest(TestCase):
+    def setUp(self):
+        self.backend = HashingPoolModelBackend()
+        self.user = UserModel.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='Test1234!',
+        )
+
+    def test_authenticate(self):
+        user = self.backend.authenticate(
+            None, username='testuser', password='Test1234!'
+        )
+        self.assertEqual(user, self.user)
+
+    def test_wrong_password(self):
+        user = self.backend.authenticate(
+            None, username='testuser', password='wrong'
+        )
+        self.assertIsNone(user)
+
+    @patch('connector.backends.hashing.make_password')
+    def test_unknown_user_runs_dummy_hash(self, mock_make_password):
+        user = self.backend.authenticate(
+            None, username='nonexistent', password='Test1234!'
+        )
+        self.assertIsNone(user)
+        mock_make_password.assert_called_once_with('Test1234!')
+
+    def test_outdated_hash_is_upgraded(self):
+        hasher = PBKDF2PasswordHasher()
+        outdated = hasher.encode('Test1234!', hasher.salt(), iterations=1000)
+        UserModel.objects.filter(pk=self.user.pk).update(password=outdated)
+        user = self.backend.authenticate(
+            None, username='testuser', password='Test1234!'
+        )
+        user.refresh_from_db()
+        self.assertNotEqual(user.password, outdated)
+        self.assertFalse(hasher.must_update(user.password))
+
+    @override_settings(PASSWORD_REHASH_IN_BACKGROUND=True)
+    @patch('connector.backends._rehash_executor.submit')
+    def test_outdated_hash_is_upgraded_in_background(self, mock_submit):
+        hasher = PBKDF2PasswordHasher()
+        outdated = hasher.encode('Test1234!', hasher.salt(), iterations=1000)
+        UserModel.objects.filter(pk=self.user.pk).update(password=outdated)
+        user = self.backend.authenticate(
+            None, username='testuser', password='Test1234!'
+        )
+        self.assertEqual(user, self.user)
+        mock_submit.assert_called_once()
+        user.refresh_from_db()
+        self.assertEqual(user.password, outdated)
+
+
+class UsernameOrEmailBackendTest(TestCase):
+    def setUp(self):
+        self.backend = UsernameOrEmailBackend()
+        self.user = UserModel.objects.create_user(
+            username='TestUser',
+            email='Test@Example.com',
+            password='Test1234!',
+        )
+
+    def test_authenticate_by_username(self):
+        with self.assertNumQueries(1):
+            user = self.backend.authenticate(
+                None, username='testuser', password='Test1234!'
+            )
+        self.assertEqual(user, self.user)
+
+    def test_authenticate_by_email(self):
+        with self.assertNumQueries(1):
+            user = self.backend.authenticate(
+                None, email='test@example.COM', password='Test1234!'
+            )
+        self.assertEqual(user, self.user)
+
+    def test_loads_only_login_fields(self):
+        user = self.backend.authenticate(
+            None, username='TestUser', password='Test1234!'
+        )
+        self.assertIn('first_name', user.get_deferred_fields())
+        self.assertNotIn('password', user.get_deferred_fields())
+
+    def test_accounts_differing_in_case(self):
+        other_user = UserModel.objects.create_user(
+            username='testuser', email='other@example.com', password='Other1!'
+        )
+        user = self.backend.authenticate(
+            None, username='testuser', password='Other1!'
+        )
+        self.assertEqual(user, other_user)
+
+    @patch('connector.backends.hashing.make_password')
+    def test_unknown_user_runs_dummy_hash(self, mock_make_password):
+        user = self.backend.authenticate(
+            None, email='unknown@example.com', password='Test1234!'
+        )
+        self.assertIsNone(user)
+        mock_make_password.assert_called_once_with('Test1234!')
+
+    def test_unknown_user_short_circuits_with_shared_filter(self):
+        identity_filter = IdentityFilter(0.01, 60, 600)
+        with patch(
+            'connector.backends.get_identity_filter',
+            return_value=identity_filter,
+        ), patch(
+            'connector.identities.tools.get_redis_client',
+            return_value=RedisMock(),
+        ):
+            identity_filter.might_exist('testuser')
+            with self.assertNumQueries(0):
+                user = self.backend.authenticate(
+                    None, username='unknown', password='Test1234!'
+                )
+        self.assertIsNone(user)
+
+    @patch('connector.backends.hashing.make_password')
+    def test_incomplete_filter_does_not_short_circuit(
+        self, mock_make_password
+    ):
+        # Built before the subscription, users saved meanwhile are missed
+        identity_filter = IdentityFilter(0.01, 60, 600)
+        identity_filter.build()
+        with patch(
+            'connector.backends.get_identity_filter',
+            return_value=identity_filter,
+        ), patch(
+            'connector.identities.tools.get_redis_client',
+            return_value=RedisMock(),
+        ):
+            user = self.backend.authenticate(
+                None, username='unknown', password='Test1234!'
+            )
+        self.assertIsNone(user)
+        mock_make_password.assert_called_once_with('Test1234!')
@@ -0,0 +1,199 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from connector.models import UserModel
+from connector.operations import UserOperations
+
+
+class CalibrateHashersCommandTest(TestCase):
+    def setUp(self):
+        fd, self.costs_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(self.costs_file)
+
+    def tearDown(self):
+        if os.path.exists(self.costs_file):
+            os.remove(self.costs_file)
+
+    def test_writes_costs_file(self):
+        with override_settings(PASSWORD_HASHER_COSTS_FILE=self.costs_file):
+            call_command(
+                'calibrate_hashers',
+                '--target-ms=1',
+                '--samples=1',
+                '--allow-below-default',
+                stdout=StringIO(),
+            )
+        with open(self.costs_file) as costs_file:
+            costs = json.load(costs_file)
+        self.assertLess(costs['pbkdf2_sha256']['iterations'], 260000)
+
+    def test_keeps_default_cost_as_minimum(self):
+        with override_settings(PASSWORD_HASHER_COSTS_FILE=self.costs_file):
+            call_command(
+                'calibrate_hashers',
+                '--target-ms=1',
+                '--samples=1',
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+        with open(self.costs_file) as costs_file:
+            costs = json.load(costs_file)
+        self.assertEqual(costs['pbkdf2_sha256']['iterations'], 260000)
+
+    def test_dry_run(self):
+        with override_settings(PASSWORD_HASHER_COSTS_FILE=self.costs_file):
+            call_command(
+                'calibrate_hashers',
+                '--target-ms=1',
+                '--samples=1',
+                '--dry-run',
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+        self.assertFalse(os.path.exists(self.costs_file))
+
+
+class ExportUsersCommandTest(TestCase):
+    def setUp(self):
+        self.users = [
+            UserModel.objects.create_user(
+                username=f'user{index}', email=f'user{index}@example.com'
+            )
+            for index in range(3)
+        ]
+
+    def test_exports_to_stdout(self):
+        stdout = StringIO()
+        call_command(
+            'export_users', '--chunk-size=2', stdout=stdout, stderr=StringIO()
+        )
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(
+            [row['username'] for row in rows], ['user0', 'user1', 'user2']
+        )
+
+    def test_resumes_csv_file(self):
+        fd, export_path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, export_path)
+        call_command(
+            'export_users',
+            '--output=csv',
+            f'--file={export_path}',
+            stderr=StringIO(),
+        )
+        call_command(
+            'export_users',
+            '--output=csv',
+            f'--file={export_path}',
+            f'--after={self.users[1].id}',
+            stderr=StringIO(),
+        )
+        with open(export_path) as export_file:
+            lines = export_file.read().splitlines()
+        # Header, three users, then the last one again from the resume
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith('id,'))
+        self.assertEqual(lines[3], lines[4])
+
+
+class ImportUsersCommandTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'users.ndjson')
+        self.legacy_hash = make_password('Legacy-password-1')
+        self.rows = [
+            {
+                'username': f'legacy{index}',
+                'email': f'legacy{index}@example.com',
+                'password': self.legacy_hash,
+                'first_name': 'First',
+                'last_name': 'Last',
+            }
+            for index in range(4)
+        ]
+
+    def write_rows(self, rows):
+        with open(self.path, 'w') as import_file:
+            for row in rows:
+                import_file.write(json.dumps(row) + '\n')
+
+    def import_users(self, *args):
+        stdout = StringIO()
+        call_command('import_users', self.path, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_imports_hashed_and_raw_passwords(self):
+        self.rows[1]['password'] = 'Password1!'
+        self.rows[2]['username'] = 'not valid'
+        self.write_rows(self.rows)
+        errors_path = os.path.join(self.directory.name, 'errors.ndjson')
+
+        output = self.import_users('--chunk-size=2', f'--errors={errors_path}')
+
+        self.assertIn('Imported 3 users, rejected 1 rows', output)
+        self.assertIn('rows/s', output)
+        users = UserModel.objects.in_bulk(
+            ['legacy0', 'legacy1'], field_name='username'
+        )
+        self.assertEqual(users['legacy0'].password, self.legacy_hash)
+        self.assertTrue(users['legacy1'].check_password('Password1!'))
+        with open(errors_path) as errors_file:
+            error = json.loads(errors_file.readline())
+        self.assertEqual(error['row'], 3)
+        self.assertIn('username', error['errors'])
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_rejects_hashes_of_unknown_hashers(self):
+        self.rows[0]['password'] = 'md5$salt$0123456789abcdef0123456789abcdef'
+        self.write_rows(self.rows[:1])
+
+        output = self.import_users()
+
+        self.assertIn('Imported 0 users, rejected 1 rows', output)
+        self.assertFalse(UserModel.objects.exists())
+
+    def test_resumes_from_checkpoint(self):
+        self.write_rows(self.rows)
+        with open(f'{self.path}.checkpoint', 'w') as checkpoint_file:
+            json.dump(
+                {'offset': 2, 'written': 2, 'rejected': 0}, checkpoint_file
+            )
+
+        output = self.import_users()
+
+        self.assertIn('Resuming after row 2', output)
+        self.assertEqual(
+            sorted(UserModel.objects.values_list('username', flat=True)),
+            ['legacy2', 'legacy3'],
+        )
+
+    def test_reimport_with_ignore_conflicts(self):
+        self.write_rows(self.rows[:2])
+        self.import_users()
+        self.write_rows(self.rows)
+
+        output = self.import_users('--ignore-conflicts')
+
+        self.assertIn('Imported 2 users, rejected 0 rows', output)
+        self.assertEqual(UserModel.objects.count(), 4)
+
+
+class PurgeUsersCommandTest(TestCase):
+    def test_purges_deleted_users_once(self):
+        user = UserModel.objects.create_user(
+            username='deleted', email='deleted@example.com'
+        )
+        UserOperations().delete_user_record(user)
+        stdout = StringIO()
+        call_command('purge_users', '--once', stdout=stdout)
+        self.assertIn('Purged 1 users', stdout.getvalue())
+        self.assertFalse(UserModel.objects.exists())
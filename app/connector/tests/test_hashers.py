@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase, override_settings
+
+from connector.hashers import (
+    CalibratedBCryptSHA256PasswordHasher,
+    CalibratedPBKDF2PasswordHasher,
+)
+
+
+class CalibratedHasherTest(SimpleTestCase):
+    @override_settings(
+        PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 5000}}
+    )
+    def test_reads_calibrated_cost(self):
+        hasher = CalibratedPBKDF2PasswordHasher()
+        self.assertEqual(hasher.iterations, 5000)
+        self.assertEqual(hasher.default_cost, 260000)
+
+    def test_falls_back_to_default_cost(self):
+        hasher = CalibratedPBKDF2PasswordHasher()
+        self.assertEqual(hasher.iterations, 260000)
+
+    def test_outdated_cost_must_update(self):
+        encoded = CalibratedPBKDF2PasswordHasher().encode('Test1234!', 'salt')
+        with override_settings(
+            PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 300000}}
+        ):
+            hasher = CalibratedPBKDF2PasswordHasher()
+            self.assertTrue(hasher.must_update(encoded))
+
+    def test_scale_pbkdf2_cost(self):
+        hasher = CalibratedPBKDF2PasswordHasher()
+        self.assertEqual(hasher.scale_cost(elapsed=0.1, target=0.15), 390000)
+
+    def test_scale_bcrypt_cost(self):
+        hasher = CalibratedBCryptSHA256PasswordHasher()
+        self.assertEqual(hasher.scale_cost(elapsed=0.1, target=0.4), 14)
@@ -0,0 +1,105 @@
+from django.contrib.auth.hashers import check_password
+from django.test import TestCase, override_settings
+
+from connector import hashing
+
+
+class InlineHashingTest(TestCase):
+    def tearDown(self):
+        hashing.reset_executor()
+
+    def test_make_password(self):
+        encoded = hashing.make_password('Test1234!')
+        self.assertTrue(check_password('Test1234!', encoded))
+
+    def test_make_passwords(self):
+        encoded = hashing.make_passwords(['Test1234!', 'Other1234!'])
+        self.assertTrue(check_password('Test1234!', encoded[0]))
+        self.assertTrue(check_password('Other1234!', encoded[1]))
+
+    def test_verify_password(self):
+        encoded = hashing.make_password('Test1234!')
+        self.assertEqual(
+            hashing.verify_password('Test1234!', encoded), (True, False)
+        )
+        self.assertEqual(
+            hashing.verify_password('wrong', encoded), (False, False)
+        )
+
+    def test_verify_password_outdated_hasher(self):
+        encoded = hashing._make_password('Test1234!')
+        with override_settings(
+            PASSWORD_HASHERS=[
+                'django.contrib.auth.hashers.SHA1PasswordHasher',
+                'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+            ]
+        ):
+            self.assertEqual(
+                hashing.verify_password('Test1234!', encoded), (True, True)
+            )
+
+    def test_verify_unusable_password(self):
+        self.assertEqual(
+            hashing.verify_password('Test1234!', '!unusable'), (False, False)
+        )
+
+    def test_is_encoded(self):
+        self.assertTrue(hashing.is_encoded(hashing.make_password('Test1234!')))
+        self.assertTrue(hashing.is_encoded('!unusable'))
+        self.assertFalse(hashing.is_encoded('Test1234!'))
+
+    def test_looks_encoded(self):
+        for encoded in (
+            'md5$salt$0123456789abcdef0123456789abcdef',
+            'crypt$$ab1234567890',
+            '$2b$12$R9h/cIPz0gi.URNNX3kh2OPST9/PgBkqquzi.Ss7KIUgO2t0jWMUW',
+            '0123456789abcdef0123456789abcdef',
+        ):
+            self.assertTrue(hashing.looks_encoded(encoded), encoded)
+        self.assertFalse(hashing.looks_encoded('Test1234!'))
+        self.assertFalse(hashing.looks_encoded('Pa$$word1!'))
+
+
+@override_settings(
+    PASSWORD_HASHING_EXECUTOR={
+        'ENABLED': True,
+        'MAX_WORKERS': 1,
+        'MAX_QUEUE_SIZE': 0,
+        'TIMEOUT': 30,
+    }
+)
+class PooledHashingTest(TestCase):
+    def setUp(self):
+        hashing.reset_executor()
+
+    def tearDown(self):
+        hashing.reset_executor()
+
+    def test_hashing_runs_on_pool(self):
+        executor = hashing.get_executor()
+        self.assertIsInstance(executor, hashing.HashingExecutor)
+        encoded = hashing.make_password('Test1234!')
+        self.assertEqual(
+            hashing.verify_password('Test1234!', encoded), (True, False)
+        )
+
+    def test_start_sets_up_the_pool(self):
+        executor = hashing.get_executor()
+        executor.start()
+        self.assertEqual(len(executor._pool._processes), 1)
+
+    def test_make_passwords_within_queue_slots(self):
+        passwords = [f'Test{i}!' for i in range(3)]
+        encoded = hashing.make_passwords(passwords, chunk_size=2)
+        self.assertEqual(len(encoded), 3)
+        for password, hashed in zip(passwords, encoded):
+            self.assertTrue(check_password(password, hashed))
+
+    def test_full_queue_is_rejected(self):
+        executor = hashing.get_executor()
+        executor._slots.acquire()
+        try:
+            with self.assertRaises(hashing.HashingUnavailable):
+                hashing.make_password('Test1234!')
+        finally:
+            executor._slots.release()
@@ -0,0 +1,124 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from connector.identities import IdentityFilter
+from connector.models import UserModel
+from connector.utils import tools
+from connector.utils.bloom import BloomFilter
+from connector.utils.test_mocker import RedisMock
+
+
+class IdentityFilterTest(TestCase):
+    def setUp(self):
+        self.redis = RedisMock()
+        patcher = patch(
+            'connector.identities.tools.get_redis_client',
+            return_value=self.redis,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        UserModel.objects.create_user(
+            username='TestUser', email='Test@Example.com'
+        )
+
+    def identity_filter(self):
+        return IdentityFilter(0.01, sync_interval=60, rebuild_interval=600)
+
+    def test_built_from_user_table(self):
+        identity_filter = self.identity_filter()
+        self.assertTrue(identity_filter.might_exist('testuser'))
+        self.assertTrue(identity_filter.might_exist('TEST@example.com'))
+        with self.assertNumQueries(0):
+            self.assertFalse(identity_filter.might_exist('unknown'))
+
+    def test_sync_reads_new_users(self):
+        identity_filter = self.identity_filter()
+        identity_filter.might_exist('testuser')
+        UserModel.objects.bulk_create(
+            [UserModel(username='newuser', email='new@example.com')]
+        )
+        self.assertFalse(identity_filter.might_exist('newuser'))
+        identity_filter.sync()
+        self.assertTrue(identity_filter.might_exist('newuser'))
+
+    def test_saved_users_reach_other_workers(self):
+        worker, other_worker = self.identity_filter(), self.identity_filter()
+        other_worker.might_exist('testuser')
+        self.assertTrue(other_worker.is_shared())
+        worker.add('renamed', 'renamed@example.com')
+        self.assertTrue(other_worker.might_exist('Renamed'))
+
+    def test_users_saved_during_rebuild_are_kept(self):
+        identity_filter = self.identity_filter()
+
+        def save_during_rebuild(*args):
+            identity_filter.add('pending')
+            return BloomFilter(*args)
+
+        with patch(
+            'connector.identities.BloomFilter', side_effect=save_during_rebuild
+        ):
+            identity_filter.rebuild()
+        self.assertTrue(identity_filter.might_exist('pending'))
+
+    def test_unbuilt_filter_keeps_no_users(self):
+        identity_filter = self.identity_filter()
+        identity_filter.add('saved', 'saved@example.com')
+        self.assertIsNone(identity_filter.bloom)
+        self.assertIsNone(identity_filter._added_during_rebuild)
+
+    def test_not_shared_without_redis(self):
+        with patch(
+            'connector.identities.tools.get_redis_client', return_value=None
+        ):
+            self.assertFalse(self.identity_filter().is_shared())
+
+    def test_complete_once_built_after_subscription(self):
+        identity_filter = self.identity_filter()
+        identity_filter.might_exist('testuser')
+        self.assertTrue(identity_filter.is_complete())
+
+    def test_inherited_filter_is_incomplete(self):
+        # Built without a subscription, as the gunicorn master does
+        identity_filter = self.identity_filter()
+        identity_filter.build()
+        self.assertFalse(identity_filter.is_complete())
+        identity_filter.rebuild()
+        self.assertTrue(identity_filter.is_complete())
+
+    def test_lost_subscription_is_renewed(self):
+        identity_filter = self.identity_filter()
+        identity_filter.might_exist('testuser')
+        key = (identity_filter.channel, identity_filter._on_saved)
+        tools._subscriptions[key][2].alive = False
+
+        with patch.object(identity_filter, 'rebuild') as rebuild:
+            with self.assertLogs('connector.utils.tools', 'WARNING'):
+                self.assertFalse(identity_filter.is_complete())
+            # Wait for the background rebuild
+            self.assertTrue(identity_filter._rebuild_lock.acquire(timeout=5))
+            identity_filter._rebuild_lock.release()
+        rebuild.assert_called_once_with()
+        self.assertTrue(tools._subscriptions[key][2].is_alive())
+
+    def test_build_syncs_a_fresh_filter(self):
+        identity_filter = self.identity_filter()
+        identity_filter.build()
+        UserModel.objects.bulk_create(
+            [UserModel(username='lateuser', email='late@example.com')]
+        )
+        with patch.object(identity_filter, 'rebuild') as rebuild:
+            identity_filter.build()
+        rebuild.assert_not_called()
+        self.assertIn('lateuser', identity_filter.bloom)
+
+    def test_build_rebuilds_an_old_filter_in_the_background(self):
+        identity_filter = self.identity_filter()
+        identity_filter.build()
+        identity_filter.built_at -= identity_filter.rebuild_interval
+        with patch.object(identity_filter, 'rebuild') as rebuild:
+            identity_filter.build()
+            self.assertTrue(identity_filter._rebuild_lock.acquire(timeout=5))
+            identity_filter._rebuild_lock.release()
+        rebuild.assert_called_once_with()
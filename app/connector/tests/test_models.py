@@ -1,6 +1,6 @@
 from django.test import TestCase
 
-from connector.models import UserModel
+from connector.models import StaleVersionError, UserModel
 
 
 class UserModelTest(TestCase):
@@ -30,3 +30,27 @@ class UserModelTest(TestCase):
         )
         self.assertTrue(superuser.is_staff)
         self.assertTrue(superuser.is_superuser)
+
+    def test_update_increments_version(self):
+        user = UserModel.objects.create_user(**self.user_data)
+        self.assertEqual(user.version, 0)
+        user.first_name = 'Updated'
+        user.save()
+        user.save(update_fields=['first_name'])
+        user.refresh_from_db()
+        self.assertEqual(user.version, 2)
+
+    def test_stale_save_is_rejected(self):
+        user = UserModel.objects.create_user(**self.user_data)
+        stale = UserModel.objects.get(pk=user.pk)
+        user.first_name = 'First'
+        user.save(update_fields=['first_name'])
+
+        stale.last_name = 'Second'
+        with self.assertRaises(StaleVersionError):
+            stale.save(update_fields=['last_name'])
+        self.assertEqual(stale.version, 0)
+        # The test transaction is still usable
+        self.assertTrue(UserModel.objects.filter(pk=user.pk).exists())
+        user.refresh_from_db()
+        self.assertEqual((user.last_name, user.version), ('User', 1))
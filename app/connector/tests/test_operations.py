@@ -1,9 +1,26 @@
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
 
-from connector.models import UserModel
-from connector.operations import EmailVerificationOperations, UserOperations
+from connector.models import EmailOutbox, StaleVersionError, UserModel
+from connector.operations import (
+    BulkUserOperations,
+    EmailVerificationOperations,
+    OTPStore,
+    OTPUnavailable,
+    TokenOperations,
+    UserIdentityMap,
+    UserOperations,
+    UserPurgeOperations,
+)
+from connector.utils.test_mocker import RedisMock
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
 
 
 class UserOperationsTest(TestCase):
@@ -37,25 +54,267 @@ class UserOperationsTest(TestCase):
     def test_delete_user_record(self):
         operation = UserOperations()
         operation.delete_user_record(self.user_instance)
-        with self.assertRaises(UserModel.DoesNotExist):
-            UserModel.objects.get(id=self.user_instance.id)
+        user = UserModel.objects.get(id=self.user_instance.id)
+        self.assertFalse(user.is_active)
+        self.assertIsNotNone(user.deleted_at)
+
+
+class UserIdentityMapTest(TestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create(
+            username='existing_user', email='existing@example.com'
+        )
+        self.request = Request(RequestFactory().get('/'))
+        self.request.user = self.user
+
+    def test_authenticated_user_is_reused(self):
+        with self.assertNumQueries(0):
+            user = UserOperations(self.request).get_user_instance(self.user.id)
+        self.assertIs(user, self.user)
+
+    def test_user_is_loaded_once_per_request(self):
+        other_user = UserModel.objects.create(
+            username='other_user', email='other@example.com'
+        )
+        with self.assertNumQueries(1):
+            first = UserOperations(self.request).get_user_instance(
+                other_user.id
+            )
+            second = UserOperations(self.request).get_user_instance(
+                other_user.id
+            )
+        self.assertIs(first, second)
+
+    def test_map_is_stored_on_the_request(self):
+        self.assertIs(
+            UserIdentityMap.for_request(self.request),
+            UserIdentityMap.for_request(self.request._request),
+        )
+
+
+class BulkUserOperationsTest(TestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create(
+            username='existing_user', email='existing@example.com'
+        )
+        self.operations = BulkUserOperations(chunk_size=2)
+
+    def test_create_users(self):
+        rows = [
+            {
+                'username': f'user{index}',
+                'email': f'user{index}@example.com',
+                'password': 'Password1!',
+                'first_name': 'First',
+                'last_name': 'Last',
+            }
+            for index in range(3)
+        ]
+        rows.append({**rows[0], 'password': None})
+        del rows[3]['password']
+        rows[3].update(username='nopassword', email='nopassword@example.com')
+
+        result = self.operations.create_users(rows)
+
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(
+            [row['index'] for row in result['created']], [0, 1, 2, 3]
+        )
+        users = UserModel.objects.in_bulk(
+            [row['id'] for row in result['created']]
+        )
+        first = users[result['created'][0]['id']]
+        self.assertEqual(first.username, 'user0')
+        self.assertTrue(first.check_password('Password1!'))
+        self.assertFalse(
+            users[result['created'][3]['id']].has_usable_password()
+        )
+
+    def test_create_reports_invalid_and_duplicate_rows(self):
+        row = {
+            'username': 'batchuser',
+            'email': 'batch@example.com',
+            'first_name': 'First',
+            'last_name': 'Last',
+        }
+        rows = [
+            row,
+            {**row, 'email': 'other@example.com', 'username': 'BATCHUSER'},
+            {**row, 'username': 'taken', 'email': 'EXISTING@example.com'},
+            {**row, 'username': 'bad name', 'email': 'bad@example.com'},
+        ]
+
+        result = self.operations.create_users(rows)
+
+        self.assertEqual([row['index'] for row in result['created']], [0])
+        self.assertEqual(
+            [
+                (error['index'], list(error['errors']))
+                for error in result['errors']
+            ],
+            [(1, ['username']), (2, ['email']), (3, ['username'])],
+        )
+        self.assertEqual(UserModel.objects.count(), 2)
+
+    def test_update_users(self):
+        other = UserModel.objects.create(
+            username='other_user', email='other@example.com'
+        )
+        rows = [
+            {'id': self.user.id, 'first_name': 'Updated'},
+            {'id': other.id, 'email': 'changed@example.com'},
+            {'id': other.id, 'first_name': 'Twice'},
+            {'id': 0, 'first_name': 'Missing'},
+            {'id': self.user.id, 'username': 'OTHER_USER'},
+        ]
+
+        result = self.operations.update_users(rows)
+
+        self.assertEqual([row['index'] for row in result['updated']], [0, 1])
+        self.assertEqual(
+            [error['index'] for error in result['errors']], [2, 3, 4]
+        )
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Updated')
+        self.assertEqual(self.user.version, 1)
+        self.assertEqual(other.email, 'changed@example.com')
+        self.assertFalse(other.email_verified)
+
+    def test_update_users_keeps_concurrent_save(self):
+        def save_concurrently(valid):
+            user = UserModel.objects.get(pk=self.user.pk)
+            user.last_name = 'Concurrent'
+            user.save()
+
+        with patch.object(
+            self.operations, 'hash_passwords', side_effect=save_concurrently
+        ):
+            self.operations.update_users(
+                [{'id': self.user.id, 'first_name': 'Bulk'}]
+            )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Bulk')
+        self.assertEqual(self.user.last_name, 'Concurrent')
+        # Each write has its own version, so its own ETag
+        self.assertEqual(self.user.version, 2)
+
+    def test_save_racing_update_users_is_stale(self):
+        user = UserModel.objects.get(pk=self.user.pk)
+        self.operations.update_users(
+            [{'id': self.user.id, 'first_name': 'Bulk'}]
+        )
+        user.last_name = 'Stale'
+        with self.assertRaises(StaleVersionError):
+            user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.user.first_name, self.user.last_name), ('Bulk', '')
+        )
+
+    def test_delete_users(self):
+        other = UserModel.objects.create(
+            username='other_user', email='other@example.com'
+        )
+        Token.objects.create(user=other)
+
+        result = self.operations.delete_users([self.user.id, other.id, 0])
+
+        self.assertEqual(result['deleted'], [self.user.id, other.id])
+        self.assertEqual(result['errors'][0]['index'], 2)
+        self.assertFalse(
+            UserModel.objects.filter(deleted_at__isnull=True).exists()
+        )
+        self.assertFalse(UserModel.objects.filter(is_active=True).exists())
+        # Deleting again reports the users as missing
+        result = self.operations.delete_users([other.id])
+        self.assertEqual(result['deleted'], [])
+
+
+class UserPurgeOperationsTest(TestCase):
+    def setUp(self):
+        self.users = [
+            UserModel.objects.create(
+                username=f'user{index}', email=f'user{index}@example.com'
+            )
+            for index in range(3)
+        ]
+        for user in self.users:
+            Token.objects.create(user=user)
+
+    def test_purge_removes_deleted_users_in_batches(self):
+        operations = UserOperations()
+        for user in self.users[:2]:
+            operations.delete_user_record(user)
+
+        purge = UserPurgeOperations(batch_size=1)
+        self.assertEqual(purge.purge_batch(), 1)
+        self.assertEqual(purge.purge(), 1)
+
+        self.assertEqual(list(UserModel.objects.all()), self.users[2:])
+        self.assertEqual(Token.objects.get().user, self.users[2])
+
+    def test_grace_period(self):
+        UserOperations().delete_user_record(self.users[0])
+        self.assertEqual(UserPurgeOperations(grace_period=60).purge(), 0)
+        self.assertEqual(UserModel.objects.count(), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TokenOperationsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserModel.objects.create(
+            username='existing_user', email='existing@example.com'
+        )
+
+    def test_creates_token_on_first_login(self):
+        key = TokenOperations().get_or_create_token(self.user)
+        self.assertEqual(Token.objects.get(user=self.user).key, key)
+
+    def test_repeat_login_is_served_from_cache(self):
+        key = TokenOperations().get_or_create_token(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                TokenOperations().get_or_create_token(self.user), key
+            )
+
+    def test_existing_token_costs_one_read(self):
+        token = Token.objects.create(user=self.user)
+        with self.assertNumQueries(1):
+            key = TokenOperations().get_or_create_token(self.user)
+        self.assertEqual(key, token.key)
+
+    def test_concurrent_insert_keeps_existing_token(self):
+        token = Token.objects.create(user=self.user)
+        with patch.object(
+            TokenOperations, '_get_token_key', side_effect=[None, token.key]
+        ):
+            key = TokenOperations().get_or_create_token(self.user)
+        self.assertEqual(key, token.key)
+        self.assertEqual(Token.objects.filter(user=self.user).count(), 1)
+
+    def test_deleted_token_is_not_served(self):
+        key = TokenOperations().get_or_create_token(self.user)
+        Token.objects.filter(user=self.user).delete()
+        new_key = TokenOperations().get_or_create_token(self.user)
+        self.assertNotEqual(new_key, key)
+        self.assertEqual(Token.objects.get(user=self.user).key, new_key)
 
 
 class EmailVerificationOperationsTest(TestCase):
-    @patch('connector.operations.send_mail')
-    @patch('connector.operations.random.choices')
-    def test_send_otp_to_email(self, mock_choices, mock_send_mail):
-        mock_choices.return_value = ['1', '2', '3', '4', '5', '6']
+    @patch('connector.operations.secrets.choice')
+    def test_send_otp_to_email(self, mock_choice):
+        mock_choice.side_effect = list('123456')
         email = 'test@example.com'
         operation = EmailVerificationOperations()
-        otp = operation.send_otp_to_email(email)
-        mock_send_mail.assert_called_once_with(
-            'OTP for Email Verification',
-            'Your OTP is: 123456',
-            'test',
-            ['test@example.com'],
-            fail_silently=False,
-        )
+        with self.assertNumQueries(1):
+            otp = operation.send_otp_to_email(email)
+        message = EmailOutbox.objects.get()
+        self.assertEqual(message.subject, 'OTP for Email Verification')
+        self.assertEqual(message.body, 'Your OTP is: 123456')
+        self.assertEqual(message.from_email, 'test')
+        self.assertEqual(message.recipients, ['test@example.com'])
         self.assertEqual(otp, '123456')
 
     def test_generate_otp_default_length(self):
@@ -67,3 +326,44 @@ class EmailVerificationOperationsTest(TestCase):
         operation = EmailVerificationOperations()
         otp = operation.generate_otp(length=8)
         self.assertEqual(len(otp), 8)
+
+
+@override_settings(OTP_TTL=300, OTP_MAX_ATTEMPTS=2)
+class OTPStoreTest(TestCase):
+    def setUp(self):
+        self.redis = RedisMock()
+        patcher = patch(
+            'connector.operations.tools.get_redis_client',
+            return_value=self.redis,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = OTPStore()
+        self.store.store(1, '123456')
+
+    def test_code_works_once(self):
+        self.assertTrue(self.store.verify(1, '123456'))
+        self.assertFalse(self.store.verify(1, '123456'))
+
+    def test_attempts_are_limited(self):
+        self.assertFalse(self.store.verify(1, '000000'))
+        self.assertFalse(self.store.verify(1, '000001'))
+        # The attempts are used up, the right code no longer works
+        self.assertFalse(self.store.verify(1, '123456'))
+
+    def test_new_code_resets_attempts(self):
+        self.store.verify(1, '000000')
+        self.store.verify(1, '000001')
+        self.store.store(1, '654321')
+        self.assertTrue(self.store.verify(1, '654321'))
+
+    def test_codes_expire(self):
+        self.redis.expiry['otp:1'] = 0
+        self.assertFalse(self.store.verify(1, '123456'))
+
+    def test_unavailable_without_redis(self):
+        with patch(
+            'connector.operations.tools.get_redis_client', return_value=None
+        ):
+            with self.assertRaises(OTPUnavailable):
+                self.store.verify(1, '123456')
@@ -0,0 +1,85 @@
+from io import StringIO
+from smtplib import SMTPException
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from connector.models import EmailOutbox
+from connector.outbox import OutboxSender, enqueue_mail
+
+
+class OutboxSenderTest(TestCase):
+    def setUp(self):
+        self.sender = OutboxSender(
+            batch_size=10, max_attempts=2, backoff=30, lease=300
+        )
+        for index in range(3):
+            enqueue_mail(
+                'Subject', f'Body {index}', 'test', [f'user{index}@test.com']
+            )
+
+    def test_send_batch_reuses_connection(self):
+        with patch.object(
+            EmailBackend, 'open', autospec=True, return_value=True
+        ) as open_connection:
+            self.assertEqual(self.sender.send_batch(), (3, 0))
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['user0@test.com'])
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_failed_message_is_retried_with_backoff(self):
+        with patch.object(
+            EmailBackend,
+            'send_messages',
+            side_effect=[SMTPException('busy'), 1, 1],
+        ):
+            self.assertEqual(self.sender.send_batch(), (2, 1))
+        message = EmailOutbox.objects.get()
+        self.assertEqual(message.attempts, 1)
+        self.assertIn('busy', message.last_error)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        # Not due yet
+        self.assertEqual(self.sender.send_batch(), (0, 0))
+
+    def test_gives_up_after_max_attempts(self):
+        EmailOutbox.objects.update(attempts=1)
+        with patch.object(
+            EmailBackend, 'send_messages', side_effect=SMTPException('down')
+        ):
+            self.assertEqual(self.sender.send_batch(), (0, 3))
+        self.assertEqual(self.sender.queue_depth(), (0, 3))
+
+    def test_unreachable_server_fails_the_batch(self):
+        with patch.object(
+            EmailBackend, 'open', side_effect=OSError('unreachable')
+        ):
+            self.assertEqual(self.sender.send_batch(), (0, 3))
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list('attempts', flat=True)), {1}
+        )
+
+    def test_claimed_messages_are_not_sent_twice(self):
+        claimed = self.sender.claim()
+        self.assertEqual(len(claimed), 3)
+        self.assertEqual(self.sender.claim(), [])
+
+
+class RunMailWorkerCommandTest(TestCase):
+    def test_sends_once(self):
+        enqueue_mail('Subject', 'Body', 'test', ['user@test.com'])
+        stdout = StringIO()
+        call_command('run_mail_worker', '--once', stdout=stdout)
+        self.assertIn('Sent 1 emails, 0 failed', stdout.getvalue())
+        self.assertIn('Outbox: 0 waiting, 0 given up', stdout.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_status(self):
+        enqueue_mail('Subject', 'Body', 'test', ['user@test.com'])
+        stdout = StringIO()
+        call_command('run_mail_worker', '--status', stdout=stdout)
+        self.assertIn('Outbox: 1 waiting, 0 given up', stdout.getvalue())
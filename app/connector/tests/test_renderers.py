@@ -0,0 +1,39 @@
+import json
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from connector.renderers import ORJSONRenderer
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    def setUp(self):
+        self.renderer = ORJSONRenderer()
+
+    def test_matches_json_renderer(self):
+        data = {'id': 1, 'name': 'Añil', 'roles': ['a', 'b'], 'none': None}
+        self.assertEqual(
+            self.renderer.render(data), JSONRenderer().render(data)
+        )
+
+    def test_types_of_the_drf_encoder(self):
+        data = {
+            'set': {1},
+            'lazy': gettext_lazy('Invalid value'),
+            'decimal': Decimal('1.5'),
+        }
+        self.assertEqual(
+            json.loads(self.renderer.render(data)),
+            {'set': [1], 'lazy': 'Invalid value', 'decimal': 1.5},
+        )
+
+    def test_empty_body(self):
+        self.assertEqual(self.renderer.render(None), b'')
+
+    def test_indent(self):
+        rendered = self.renderer.render(
+            {'id': 1}, 'application/json; indent=4', {}
+        )
+        self.assertEqual(rendered, b'{\n  "id": 1\n}')
@@ -0,0 +1,146 @@
+import time
+from unittest.mock import patch
+
+from django.test import TestCase
+from redis.exceptions import RedisError
+
+from connector.models import UserModel
+from connector.revocation import RevocationList, RevocationUnavailable
+from connector.tokens import FAMILY_CLAIM, RefreshToken
+from connector.utils.bloom import BloomFilter
+from connector.utils.test_mocker import RedisMock
+
+
+class BloomFilterTest(TestCase):
+    def test_added_items_are_found(self):
+        bloom = BloomFilter(1000)
+        items = [f'jti-{i}' for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class RevocationListTest(TestCase):
+    def setUp(self):
+        self.redis = RedisMock()
+        patcher = patch(
+            'connector.revocation.tools.get_redis_client',
+            return_value=self.redis,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = UserModel.objects.create_user(username='testuser')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.access = self.refresh.access_token
+
+    def revocation_list(self, **kwargs):
+        return RevocationList(1000, 0.001, rebuild_interval=60, **kwargs)
+
+    def test_token_is_not_revoked(self):
+        revocation_list = self.revocation_list()
+        revocation_list.is_revoked(self.access)
+        with patch.object(self.redis, 'zscore') as zscore:
+            self.assertFalse(revocation_list.is_revoked(self.access))
+        zscore.assert_not_called()
+
+    def test_revoked_token(self):
+        revocation_list = self.revocation_list()
+        revocation_list.revoke_token(self.access)
+        self.assertTrue(revocation_list.is_revoked(self.access))
+        self.assertFalse(revocation_list.is_revoked(self.refresh))
+
+    def test_revocation_reaches_other_workers(self):
+        worker, other_worker = self.revocation_list(), self.revocation_list()
+        other_worker.is_revoked(self.access)
+        worker.revoke_token(self.access)
+        self.assertTrue(other_worker.is_revoked(self.access))
+
+    def test_new_worker_loads_revocations(self):
+        self.revocation_list().revoke_token(self.access)
+        self.assertTrue(self.revocation_list().is_revoked(self.access))
+
+    def test_revoked_family(self):
+        revocation_list = self.revocation_list()
+        revocation_list.revoke_family(self.refresh[FAMILY_CLAIM])
+        self.assertTrue(revocation_list.is_revoked(self.refresh))
+        self.assertTrue(revocation_list.is_revoked(self.access))
+
+    def test_revoke_user(self):
+        revocation_list = self.revocation_list()
+        other_refresh = RefreshToken.for_user(self.user)
+        for refresh in (self.refresh, other_refresh):
+            revocation_list.register_family(
+                self.user.id, refresh[FAMILY_CLAIM]
+            )
+        revocation_list.revoke_user(self.user.id)
+        self.assertTrue(revocation_list.is_revoked(self.access))
+        self.assertTrue(revocation_list.is_revoked(other_refresh))
+
+    def test_rebuild_drops_expired_entries(self):
+        revocation_list = self.revocation_list()
+        self.redis.zadd(revocation_list.redis_key, {'expired': time.time()})
+        revocation_list.rebuild()
+        self.assertEqual(self.redis.zcard(revocation_list.redis_key), 0)
+
+    def test_refresh_token_is_used_once(self):
+        revocation_list = self.revocation_list()
+        self.assertTrue(revocation_list.mark_used(self.refresh))
+        self.assertFalse(revocation_list.mark_used(self.refresh))
+
+    def test_without_redis_nothing_is_revoked(self):
+        revocation_list = self.revocation_list()
+        with patch(
+            'connector.revocation.tools.get_redis_client', return_value=None
+        ):
+            revocation_list.revoke_token(self.access)
+            self.assertFalse(revocation_list.is_revoked(self.access))
+
+    def test_redis_failure_is_not_a_pass(self):
+        revocation_list = self.revocation_list()
+        with patch.object(self.redis, 'zcard', side_effect=RedisError):
+            with self.assertLogs('connector.revocation', 'ERROR'):
+                with self.assertRaises(RevocationUnavailable):
+                    revocation_list.is_revoked(self.refresh)
+        revocation_list.revoke_token(self.access)
+        with patch.object(self.redis, 'zscore', side_effect=RedisError):
+            with self.assertLogs('connector.revocation', 'ERROR'):
+                with self.assertRaises(RevocationUnavailable):
+                    revocation_list.is_revoked(self.access)
+        with patch.object(self.redis, 'set', side_effect=RedisError):
+            with self.assertLogs('connector.revocation', 'ERROR'):
+                with self.assertRaises(RevocationUnavailable):
+                    revocation_list.mark_used(self.refresh)
+
+    def test_access_fail_open(self):
+        revocation_list = self.revocation_list()
+        with patch.object(self.redis, 'zcard', side_effect=RedisError):
+            with self.assertLogs('connector.revocation', 'ERROR') as logs:
+                self.assertFalse(
+                    revocation_list.is_access_revoked(self.access)
+                )
+        self.assertIn(self.access['jti'], logs.output[-1])
+
+        revocation_list = self.revocation_list(access_fail_open=False)
+        with patch.object(self.redis, 'zcard', side_effect=RedisError):
+            with self.assertLogs('connector.revocation', 'ERROR'):
+                self.assertTrue(revocation_list.is_access_revoked(self.access))
+
+    def test_lost_subscription_rebuilds(self):
+        revocation_list = self.revocation_list()
+        revocation_list.is_revoked(self.access)
+        # Broadcast while the worker was not listening
+        self.redis.zadd(
+            revocation_list.redis_key,
+            {self.access['jti']: self.access['exp']},
+        )
+        self.assertFalse(revocation_list.is_revoked(self.access))
+        revocation_list._on_subscribed(renewed=True)
+        with revocation_list._rebuild_lock:
+            self.assertTrue(revocation_list.is_revoked(self.access))
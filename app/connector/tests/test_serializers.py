@@ -1,9 +1,12 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import serializers
 
 from connector.models import UserModel
 from connector.serializers import (
     UserLoginSerializer,
+    UserProjectionSerializer,
     UserRegistrationSerializer,
     UserSerializer,
 )
@@ -77,3 +80,43 @@ class UserSerializerTest(TestCase):
         updated_user = serializer.save()
         self.assertEqual(updated_user.email, 'new@example.com')
         self.assertFalse(updated_user.email_verified)
+
+    def test_update_writes_changed_fields_only(self):
+        user = UserModel.objects.create(
+            username='testuser', email='test@example.com'
+        )
+        data = {'username': 'testuser', 'first_name': 'Test'}
+        serializer = UserSerializer(user, data=data, partial=True)
+        # No uniqueness query for the unchanged username
+        with self.assertNumQueries(0):
+            serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+        update = queries.captured_queries[0]['sql']
+        self.assertIn('"first_name"', update)
+        self.assertNotIn('"username"', update)
+        self.assertEqual(user.version, 1)
+
+    def test_unchanged_update_skips_write(self):
+        user = UserModel.objects.create(
+            username='testuser', email='test@example.com'
+        )
+        serializer = UserSerializer(
+            user, data={'email': 'test@example.com'}, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        with self.assertNumQueries(0):
+            serializer.save()
+        self.assertEqual(user.version, 0)
+
+
+class UserProjectionSerializerTest(TestCase):
+    def test_fields_match_user_serializer(self):
+        user = UserModel.objects.create_user(
+            username='testuser', email='test@example.com', password='Test1!'
+        )
+        expected = UserSerializer(user).data
+        del expected['password']
+        self.assertEqual(
+            UserProjectionSerializer.to_representation(user), expected
+        )
@@ -0,0 +1,119 @@
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from connector.models import UserModel
+from connector.throttling import SlidingWindowThrottle
+from connector.utils.test_mocker import RedisMock
+
+THROTTLE_RATES = {
+    'login_ip': '3/min',
+    'login_identity': '2/min',
+    'registration_ip': '2/hour',
+    'registration_identity': '2/hour',
+    'otp_ip': '5/hour',
+    'otp_identity': '1/hour',
+}
+
+
+@patch.object(SlidingWindowThrottle, 'THROTTLE_RATES', THROTTLE_RATES)
+class SlidingWindowThrottleTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.redis = RedisMock()
+        patcher = patch(
+            'connector.throttling.tools.get_redis_client',
+            return_value=self.redis,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = UserModel.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+        )
+
+    def login(self, username, password='wrongpassword'):
+        return self.client.post(
+            reverse('api_login'),
+            {'username': username, 'password': password},
+        )
+
+    def test_login_is_throttled_per_username(self):
+        for _ in range(2):
+            response = self.login('testuser')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with patch('connector.backends.hashing.verify_password') as verify:
+            response = self.login('TestUser', password='testpassword')
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertGreater(int(response['Retry-After']), 0)
+        verify.assert_not_called()
+
+    def test_login_is_throttled_per_ip(self):
+        for username in ('user1', 'user2', 'user3'):
+            self.login(username)
+        response = self.login('user4')
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    def test_body_that_is_not_an_object(self):
+        for body in ([{'username': 'testuser'}], 'testuser'):
+            response = self.client.post(
+                reverse('api_login'), body, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Still counted per client address
+        self.login('testuser')
+        response = self.login('testuser')
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    def test_registration_is_throttled(self):
+        url = reverse('api_register')
+        for i in range(2):
+            self.client.post(url, {'username': f'user{i}'})
+        response = self.client.post(url, {'username': 'user2'})
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    def test_send_otp_is_throttled_per_user(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with patch('connector.views.EmailVerificationOperations') as mail:
+            mail.return_value.generate_otp.return_value = '123456'
+            response = self.client.post('/api/send-otp/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.post('/api/send-otp/')
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+            }
+        }
+    )
+    def test_without_redis_falls_back_to_cache(self):
+        with patch.object(SlidingWindowThrottle, 'cache', caches['default']):
+            with patch(
+                'connector.throttling.tools.get_redis_client',
+                return_value=None,
+            ):
+                for _ in range(2):
+                    self.login('testuser')
+                response = self.login('testuser')
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
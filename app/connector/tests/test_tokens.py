@@ -0,0 +1,142 @@
+import json
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.test import SimpleTestCase
+from jwt import ExpiredSignatureError
+from jwt.algorithms import RSAAlgorithm
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.tokens import TokenError
+
+from connector.tokens import AccessToken, CachedTokenBackend
+
+
+class CachedTokenBackendTest(SimpleTestCase):
+    def setUp(self):
+        self.backend = CachedTokenBackend('HS512', 'secret', cache_size=2)
+        self.payload = {'user_id': 1, 'exp': int(time.time()) + 60}
+        self.token = self.backend.encode(self.payload)
+
+    def test_repeated_token_is_verified_once(self):
+        with patch(
+            'rest_framework_simplejwt.backends.jwt.decode',
+            return_value=dict(self.payload),
+        ) as mock_decode:
+            self.assertEqual(self.backend.decode(self.token), self.payload)
+            self.assertEqual(self.backend.decode(self.token), self.payload)
+        mock_decode.assert_called_once()
+        self.assertEqual(self.backend.cache.hits, 1)
+        self.assertEqual(self.backend.cache.misses, 1)
+
+    def test_tampered_token_is_rejected(self):
+        self.backend.decode(self.token)
+        header, payload, signature = self.token.split('.')
+        with self.assertRaises(TokenBackendError):
+            self.backend.decode(f'{header}.{payload}.{signature[::-1]}')
+
+    def test_expired_token_is_not_served(self):
+        self.backend.decode(self.token)
+        with patch(
+            'connector.tokens.time.time', return_value=time.time() + 61
+        ), patch(
+            'rest_framework_simplejwt.backends.jwt.decode',
+            side_effect=ExpiredSignatureError,
+        ) as mock_decode:
+            with self.assertRaises(TokenBackendError):
+                self.backend.decode(self.token)
+        mock_decode.assert_called_once()
+
+    def test_cache_is_bounded(self):
+        for user_id in range(3):
+            self.backend.decode(
+                self.backend.encode({**self.payload, 'user_id': user_id})
+            )
+        self.assertEqual(len(self.backend.cache), 2)
+        self.assertEqual(self.backend.cache.evictions, 1)
+
+    def test_returned_claims_are_copies(self):
+        self.backend.decode(self.token)['user_id'] = 2
+        self.assertEqual(self.backend.decode(self.token)['user_id'], 1)
+
+
+class AccessTokenTest(SimpleTestCase):
+    def test_expired_access_token_is_rejected(self):
+        token = AccessToken()
+        token['user_id'] = 1
+        token.set_exp(lifetime=timedelta(seconds=-1))
+        with self.assertRaises(TokenError):
+            AccessToken(str(token))
+
+
+def generate_rsa_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = (
+        key.public_key()
+        .public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+    return private_pem, public_pem
+
+
+class AsymmetricTokenBackendTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.old_key = generate_rsa_key()
+        cls.new_key = generate_rsa_key()
+
+    def setUp(self):
+        self.payload = {'user_id': 1, 'exp': int(time.time()) + 60}
+
+    def test_token_carries_key_id(self):
+        backend = CachedTokenBackend('RS256', *self.new_key)
+        token = backend.encode(self.payload)
+        self.assertEqual(
+            jwt.get_unverified_header(token)['kid'], backend.key_id
+        )
+        self.assertEqual(backend.decode(token), self.payload)
+
+    def test_rotation_accepts_retired_key(self):
+        old_backend = CachedTokenBackend('RS256', *self.old_key)
+        new_backend = CachedTokenBackend(
+            'RS256', *self.new_key, extra_verifying_keys=[self.old_key[1]]
+        )
+        token = old_backend.encode(self.payload)
+        self.assertEqual(new_backend.decode(token), self.payload)
+        self.assertEqual(
+            [jwk['kid'] for jwk in new_backend.jwks],
+            [new_backend.key_id, old_backend.key_id],
+        )
+
+    def test_unknown_key_id_is_rejected(self):
+        old_backend = CachedTokenBackend('RS256', *self.old_key)
+        new_backend = CachedTokenBackend('RS256', *self.new_key)
+        with self.assertRaises(TokenBackendError):
+            new_backend.decode(old_backend.encode(self.payload))
+
+    def test_jwks_holds_public_keys_only(self):
+        backend = CachedTokenBackend('RS256', *self.new_key)
+        jwk = backend.jwks[0]
+        self.assertEqual(jwk['kty'], 'RSA')
+        self.assertEqual(jwk['alg'], 'RS256')
+        self.assertNotIn('d', jwk)
+        public_key = RSAAlgorithm.from_jwk(json.dumps(jwk))
+        token = backend.encode(self.payload)
+        self.assertEqual(
+            jwt.decode(token, public_key, algorithms=['RS256'])['user_id'], 1
+        )
+
+    def test_symmetric_backend_publishes_no_keys(self):
+        self.assertEqual(CachedTokenBackend('HS512', 'secret').jwks, [])
@@ -1,5 +1,6 @@
 from django.test import SimpleTestCase
 from django.urls import resolve, reverse
+from rest_framework_simplejwt.views import TokenRefreshView
 
 from connector import views
 
@@ -9,6 +10,14 @@ class UrlsTest(SimpleTestCase):
         url = reverse('api_login')
         self.assertEqual(resolve(url).func.view_class, views.UserLoginView)
 
+    def test_token_refresh_url_resolves(self):
+        url = reverse('api_token_refresh')
+        self.assertEqual(resolve(url).func.view_class, TokenRefreshView)
+
+    def test_availability_url_resolves(self):
+        url = reverse('api_availability')
+        self.assertEqual(resolve(url).func.view_class, views.AvailabilityView)
+
     def test_registration_url_resolves(self):
         url = reverse('api_register')
         self.assertEqual(
@@ -40,3 +49,20 @@ class UrlsTest(SimpleTestCase):
         resolver_match = resolve(url)
         self.assertEqual(resolver_match.func.cls, views.UserViewSet)
         self.assertEqual(resolver_match.func.actions['put'], 'update')
+
+    def test_users_bulk_url_resolves(self):
+        url = reverse('api_users_bulk')
+        self.assertEqual(resolve(url).func.view_class, views.BulkUserView)
+
+    def test_users_lookup_url_resolves(self):
+        url = reverse('api_users_lookup')
+        self.assertEqual(resolve(url).func.view_class, views.UserLookupView)
+
+    def test_users_export_url_resolves(self):
+        url = reverse('api_users_export')
+        self.assertEqual(resolve(url).func.view_class, views.UserExportView)
+
+    def test_jwks_url_resolves(self):
+        url = reverse('jwks')
+        self.assertEqual(url, '/.well-known/jwks.json')
+        self.assertEqual(resolve(url).func.view_class, views.JWKSView)
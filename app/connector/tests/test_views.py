@@ -1,12 +1,19 @@
+import json
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from redis.exceptions import RedisError
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import AccessToken
 
 from connector.models import UserModel
+from connector.tokens import FAMILY_CLAIM, RefreshToken
+from connector.utils.test_mocker import RedisMock
 
 User = get_user_model()
 
@@ -28,10 +35,21 @@ class UserLoginViewTest(TestCase):
         response = self.client.post(reverse(self.URL_NAME_LOGIN), data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('Access Token', response.data)
+        self.assertIn('Refresh Token', response.data)
         self.assertIn('User Token', response.data)
         token = AccessToken(response.data['Access Token'])
         self.assertEqual(token['user_id'], self.user.id)
 
+    def test_valid_login_by_email(self):
+        self.user.email = 'test@example.com'
+        self.user.save()
+        data = {
+            'email': 'Test@example.com',
+            'password': 'testpassword',
+        }
+        response = self.client.post(reverse(self.URL_NAME_LOGIN), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_invalid_login(self):
         data = {
             'username': 'testuser',
@@ -150,11 +168,654 @@ class UserViewSetTest(TestCase):
         response = self.client.get(reverse(self.USER_NAME_URL))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['username'], 'testuser')
+        self.assertNotIn('password', response.data)
 
     def test_delete_user(self):
         self.client.force_authenticate(user=self.user)
         response = self.client.delete(reverse(self.USER_NAME_URL))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertFalse(
-            UserModel.objects.filter(username='testuser').exists()
+        user = UserModel.objects.get(username='testuser')
+        self.assertFalse(user.is_active)
+        self.assertIsNotNone(user.deleted_at)
+
+
+class UserQueryCountTest(TestCase):
+    """
+    Authenticated endpoints reuse the user resolved by authentication
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        # Caches the token, later requests authenticate without queries
+        self.client.get(reverse('user'))
+
+    def test_retrieve(self):
+        with self.assertNumQueries(0):
+            self.client.get(reverse('user'))
+
+    def test_update(self):
+        # UPDATE, then the token keys to invalidate
+        with self.assertNumQueries(2):
+            self.client.put(reverse('user'), {'first_name': 'Test'})
+
+    def test_unchanged_update(self):
+        with self.assertNumQueries(0):
+            response = self.client.put(
+                reverse('user'),
+                {'username': 'testuser', 'email': 'test@example.com'},
+            )
+        self.assertEqual(response['ETag'], f'"{self.user.id}-0"')
+
+    @patch('connector.operations.tools.get_redis_client')
+    @patch('connector.views.EmailVerificationOperations')
+    def test_verify_otp(self, mock_operations, mock_redis):
+        mock_redis.return_value = RedisMock()
+        mock_operations.return_value.generate_otp.return_value = '123456'
+        self.client.post('/api/send-otp/')
+        # UPDATE, then the token keys to invalidate
+        with self.assertNumQueries(2):
+            self.client.post('/api/verify-otp/', {'otp': '123456'})
+
+    def test_delete(self):
+        # UPDATE, then the token keys to invalidate, the purge cascades
+        with self.assertNumQueries(2):
+            self.client.delete(reverse('user'))
+
+
+class EmailVerificationViewSetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        patcher = patch(
+            'connector.operations.tools.get_redis_client',
+            return_value=RedisMock(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('connector.operations.secrets.choice')
+    def test_verify_otp_once(self, mock_choice):
+        mock_choice.side_effect = list('123456')
+        response = self.client.post('/api/send-otp/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('sessionid', response.cookies)
+
+        response = self.client.post('/api/verify-otp/', {'otp': '123456'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.email_verified)
+
+        response = self.client.post('/api/verify-otp/', {'otp': '123456'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unavailable_without_redis(self):
+        with patch(
+            'connector.operations.tools.get_redis_client', return_value=None
+        ):
+            response = self.client.post('/api/send-otp/')
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+
+class UserVersionConflictTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get(reverse('user'))
+
+    def test_concurrent_update_conflicts(self):
+        UserModel.objects.filter(pk=self.user.pk).update(version=5)
+        response = self.client.put(reverse('user'), {'first_name': 'Test'})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        # The stale cached user is dropped, a retry succeeds
+        response = self.client.put(reverse('user'), {'first_name': 'Test'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['ETag'], f'"{self.user.id}-6"')
+
+    def test_version_is_read_only(self):
+        response = self.client.put(
+            reverse('user'), {'first_name': 'Test', 'version': 40}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['ETag'], f'"{self.user.id}-1"')
+
+
+class UserETagTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.etag = f'"{self.user.id}-0"'
+
+    def test_retrieve_sets_etag(self):
+        response = self.client.get(reverse('user'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_not_modified(self):
+        self.client.get(reverse('user'))
+        # Only the profile version is read
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('user'), HTTP_IF_NONE_MATCH=self.etag
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(response.content)
+
+    def test_modified_after_update(self):
+        response = self.client.put(reverse('user'), {'first_name': 'Test'})
+        self.assertEqual(response['ETag'], f'"{self.user.id}-1"')
+        response = self.client.get(
+            reverse('user'), HTTP_IF_NONE_MATCH=self.etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['first_name'], 'Test')
+
+    def test_update_if_match(self):
+        response = self.client.put(
+            reverse('user'), {'first_name': 'Test'}, HTTP_IF_MATCH=self.etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_update_with_stale_etag_is_rejected(self):
+        self.client.put(reverse('user'), {'first_name': 'Other'})
+        response = self.client.put(
+            reverse('user'), {'first_name': 'Test'}, HTTP_IF_MATCH=self.etag
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Other')
+
+    def test_update_ignores_stale_version_mirror(self):
+        self.client.put(reverse('user'), {'first_name': 'Other'})
+        # The mirror still names the version the client has seen
+        with patch(
+            'connector.views.ProfileVersionOperations.get_etag',
+            return_value=self.etag,
+        ):
+            response = self.client.put(
+                reverse('user'),
+                {'first_name': 'Test'},
+                HTTP_IF_MATCH=self.etag,
+            )
+        self.assertEqual(
+            response.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Other')
+
+    def test_update_with_weak_etag_is_rejected(self):
+        response = self.client.put(
+            reverse('user'),
+            {'first_name': 'Test'},
+            HTTP_IF_MATCH=f'W/{self.etag}',
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+
+
+@override_settings(JWT_PROFILE_CLAIMS=True)
+class UserProfileClaimsTest(TestCase):
+    USER_NAME_URL = 'user'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = UserModel.objects.create_user(
+            username='testuser',
+            password='Testpassword1!',
+            first_name='name',
+            last_name='lastname',
+            email='email@email.com',
+        )
+        response = self.client.post(
+            reverse('api_login'),
+            {'username': 'testuser', 'password': 'Testpassword1!'},
+        )
+        self.access_token = response.data['Access Token']
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + self.access_token
+        )
+
+    def test_access_token_carries_profile(self):
+        token = AccessToken(self.access_token)
+        self.assertEqual(token['profile']['username'], 'testuser')
+        self.assertEqual(token['profile_version'], 0)
+
+    def test_retrieve_from_claims(self):
+        redis = RedisMock()
+        with patch(
+            'connector.operations.tools.get_redis_client', return_value=redis
+        ):
+            self.client.get(reverse(self.USER_NAME_URL))
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse(self.USER_NAME_URL))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.user.id)
+        self.assertEqual(response.data['email'], 'email@email.com')
+
+    def test_retrieve_without_redis_reads_version_only(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse(self.USER_NAME_URL))
+        self.assertEqual(response.data['username'], 'testuser')
+
+    def test_stale_snapshot_is_rejected(self):
+        redis = RedisMock()
+        with patch(
+            'connector.operations.tools.get_redis_client', return_value=redis
+        ):
+            self.client.get(reverse(self.USER_NAME_URL))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.first_name = 'Updated'
+                self.user.save()
+            response = self.client.get(reverse(self.USER_NAME_URL))
+        self.assertEqual(response.data['first_name'], 'Updated')
+
+
+class TokenRefreshViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.redis = RedisMock()
+        patcher = patch(
+            'connector.revocation.tools.get_redis_client',
+            return_value=self.redis,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword'
+        )
+        response = self.client.post(
+            reverse('api_login'),
+            {'username': 'testuser', 'password': 'testpassword'},
+        )
+        self.access = response.data['Access Token']
+        self.refresh = response.data['Refresh Token']
+
+    def refresh_tokens(self, refresh):
+        return self.client.post(
+            reverse('api_token_refresh'), {'refresh': refresh}
+        )
+
+    def get_user(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get(reverse('user'))
+
+    def test_refresh_rotates_tokens(self):
+        response = self.refresh_tokens(self.refresh)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], self.refresh)
+        response = self.get_user(response.data['access'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_reused_refresh_token_revokes_family(self):
+        rotated = self.refresh_tokens(self.refresh).data
+        response = self.refresh_tokens(self.refresh)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.refresh_tokens(rotated['refresh'])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.get_user(rotated['access'])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.get_user(self.access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_refresh_token(self):
+        response = self.refresh_tokens(self.access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_token_without_family(self):
+        refresh = RefreshToken.for_user(self.user)
+        del refresh[FAMILY_CLAIM]
+        response = self.refresh_tokens(str(refresh))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_fails_closed_without_redis(self):
+        with patch.object(self.redis, 'set', side_effect=RedisError):
+            with self.assertLogs('connector.revocation', 'ERROR'):
+                response = self.refresh_tokens(self.refresh)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        # The token was not used
+        response = self.refresh_tokens(self.refresh)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deleting_user_revokes_tokens(self):
+        response = self.get_user(self.access)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.delete(reverse('user'))
+
+        User.objects.create_user(id=self.user.id, username='testuser')
+        response = self.get_user(self.access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.refresh_tokens(self.refresh)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AvailabilityViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User.objects.create_user(username='testuser', email='test@example.com')
+
+    def get_availability(self, **params):
+        return self.client.get(reverse('api_availability'), params)
+
+    def test_taken_identities(self):
+        response = self.get_availability(
+            username='TestUser', email='test@example.com'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'username': False, 'email': False})
+
+    def test_free_identity_skips_database(self):
+        self.get_availability(username='testuser')
+        with self.assertNumQueries(0):
+            response = self.get_availability(username='newuser')
+        self.assertEqual(response.data, {'username': True})
+
+    def test_missing_identity(self):
+        response = self.get_availability()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkUserViewTest(TestCase):
+    URL_NAME = 'api_users_bulk'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = UserModel.objects.create_user(
+            username='admin', email='admin@example.com', is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.user = UserModel.objects.create_user(
+            username='testuser', email='test@example.com'
+        )
+
+    def test_bulk_create(self):
+        users = [
+            {
+                'username': f'user{index}',
+                'email': f'user{index}@example.com',
+                'password': 'Password1!',
+                'first_name': 'First',
+                'last_name': 'Last',
+            }
+            for index in range(5)
+        ]
+        response = self.client.post(
+            reverse(self.URL_NAME), {'users': users}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['created']), 5)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(UserModel.objects.count(), 7)
+
+    def test_bulk_update(self):
+        response = self.client.patch(
+            reverse(self.URL_NAME),
+            {'users': [{'id': self.user.id, 'first_name': 'Updated'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Updated')
+
+    def test_bulk_delete(self):
+        response = self.client.delete(
+            reverse(self.URL_NAME), {'ids': [self.user.id]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], [self.user.id])
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.deleted_at)
+
+    def test_empty_batch(self):
+        response = self.client.post(
+            reverse(self.URL_NAME), {'users': []}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.delete(
+            reverse(self.URL_NAME), {'ids': [self.admin.id]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class UserLookupViewTest(TestCase):
+    URL_NAME = 'api_users_lookup'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.service = UserModel.objects.create_user(
+            username='movies', email='movies@example.com', is_staff=True
+        )
+        self.client.force_authenticate(user=self.service)
+        self.users = [
+            UserModel.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@example.com',
+                first_name='First',
+                last_name='Last',
+            )
+            for index in range(3)
+        ]
+
+    def test_lookup_by_ids_and_usernames(self):
+        first, second, third = self.users
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse(self.URL_NAME),
+                {'ids': f'{first.id},{second.id},999', 'usernames': 'user2'},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(response.data['users']), {first.id, second.id, third.id}
+        )
+        self.assertEqual(
+            response.data['users'][first.id],
+            {
+                'id': first.id,
+                'username': 'user0',
+                'first_name': 'First',
+                'last_name': 'Last',
+            },
+        )
+
+    @override_settings(USERS_LOOKUP_MAX_SIZE=2)
+    def test_batch_size_is_capped(self):
+        response = self.client.get(
+            reverse(self.URL_NAME), {'ids': '1,2', 'usernames': 'user0'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_ids(self):
+        response = self.client.get(reverse(self.URL_NAME), {'ids': '1,a'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse(self.URL_NAME))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.get(reverse(self.URL_NAME), {'ids': '1'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(USERS_EXPORT_CHUNK_SIZE=2)
+class UserExportViewTest(TestCase):
+    URL_NAME = 'api_users_export'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = UserModel.objects.create_user(
+            username='admin', email='admin@example.com', is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.users = [self.admin] + [
+            UserModel.objects.create_user(
+                username=f'user{index}', email=f'user{index}@example.com'
+            )
+            for index in range(4)
+        ]
+
+    def export(self, **params):
+        response = self.client.get(reverse(self.URL_NAME), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_ndjson_export(self):
+        # One keyset query per chunk, plus the empty one that ends it
+        with self.assertNumQueries(3):
+            lines = self.export()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [row['id'] for row in rows], [user.id for user in self.users]
+        )
+        self.assertEqual(rows[1]['username'], 'user0')
+        self.assertNotIn('password', rows[0])
+
+    def test_csv_export(self):
+        lines = self.export(output='csv')
+        header = lines[0].split(',')
+        self.assertIn('username', header)
+        self.assertNotIn('password', header)
+        self.assertEqual(len(lines), len(self.users) + 1)
+
+    def test_accept_export_media_type(self):
+        for output, accept in (
+            ('csv', 'text/csv'),
+            ('ndjson', 'application/x-ndjson'),
+        ):
+            response = self.client.get(
+                reverse(self.URL_NAME), {'output': output}, HTTP_ACCEPT=accept
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], accept)
+            self.assertEqual(
+                len(b''.join(response.streaming_content).splitlines()),
+                len(self.users) + (output == 'csv'),
+            )
+
+    def test_resume_after_cursor(self):
+        lines = self.export(after=self.users[2].id)
+        self.assertEqual(
+            [json.loads(line)['id'] for line in lines],
+            [user.id for user in self.users[3:]],
+        )
+
+    def test_deleted_users_are_left_out(self):
+        UserModel.objects.filter(pk=self.users[2].pk).update(
+            is_active=False, deleted_at=timezone.now()
+        )
+        lines = self.export()
+        self.assertEqual(
+            [json.loads(line)['id'] for line in lines],
+            [user.id for user in self.users if user != self.users[2]],
+        )
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=self.users[1])
+        response = self.client.get(reverse(self.URL_NAME))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class JWKSViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_jwks_is_cacheable(self):
+        response = self.client.get(reverse('jwks'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'keys': []})
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        response = self.client.get(
+            reverse('jwks'), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_none_match_forms(self):
+        etag = self.client.get(reverse('jwks'))['ETag']
+        for header, expected in (
+            ('*', status.HTTP_304_NOT_MODIFIED),
+            (f'W/{etag}', status.HTTP_304_NOT_MODIFIED),
+            (f'"other", {etag}', status.HTTP_304_NOT_MODIFIED),
+            (f'{etag}x', status.HTTP_200_OK),
+        ):
+            response = self.client.get(
+                reverse('jwks'), HTTP_IF_NONE_MATCH=header
+            )
+            self.assertEqual(response.status_code, expected, header)
+
+
+class TokenIntrospectionViewTest(TestCase):
+    URL_NAME = 'api_introspect_batch'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.service = UserModel.objects.create_user(
+            username='gateway', email='gateway@example.com', is_staff=True
+        )
+        self.client.force_authenticate(user=self.service)
+        self.user = UserModel.objects.create_user(
+            username='testuser', email='test@example.com'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def test_batch_introspection(self):
+        access_token = str(AccessToken.for_user(self.user))
+        data = {
+            'tokens': [self.token.key, access_token, 'unknown', 'a.b.c'],
+        }
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse(self.URL_NAME), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token, jwt, unknown, invalid_jwt = response.data['results']
+        self.assertEqual(token['token_type'], 'token')
+        self.assertTrue(token['active'])
+        self.assertEqual(token['user_id'], self.user.id)
+        self.assertEqual(jwt['token_type'], 'jwt')
+        self.assertTrue(jwt['active'])
+        self.assertEqual(jwt['claims']['user_id'], self.user.id)
+        self.assertFalse(unknown['active'])
+        self.assertFalse(invalid_jwt['active'])
+
+    def test_inactive_user_token(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post(
+            reverse(self.URL_NAME), {'tokens': [self.token.key]}
+        )
+        self.assertFalse(response.data['results'][0]['active'])
+
+    def test_batch_size_is_capped(self):
+        response = self.client.post(
+            reverse(self.URL_NAME), {'tokens': ['a'] * 101}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            reverse(self.URL_NAME), {'tokens': [self.token.key]}
         )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
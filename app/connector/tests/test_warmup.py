@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from connector import warmup
+from connector.identities import get_identity_filter
+from connector.models import UserModel
+from connector.utils.test_mocker import RedisMock
+
+
+class WarmUpTest(TestCase):
+    def test_warm_up(self):
+        UserModel.objects.create_user(
+            username='warmuser', password='Testpassword1!'
+        )
+        timings = warmup.warm_up()
+        self.assertEqual(
+            [name for name, _, _ in timings],
+            [name for name, _ in warmup.WARM_UP_STEPS],
+        )
+        self.assertTrue(all(succeeded for _, _, succeeded in timings))
+        self.assertIn('warmuser', get_identity_filter().bloom)
+
+    @patch('connector.warmup.tools.get_redis_client')
+    def test_redis(self, get_redis_client):
+        get_redis_client.return_value = RedisMock()
+        timings = dict(
+            (name, succeeded) for name, _, succeeded in warmup.warm_up()
+        )
+        self.assertTrue(timings['redis'])
+
+    @patch('connector.warmup.hashers.get_hashers', side_effect=ValueError)
+    def test_failed_step_is_skipped(self, get_hashers):
+        with self.assertLogs('connector.warmup', 'ERROR'):
+            timings = warmup.warm_up()
+        succeeded = {name: succeeded for name, _, succeeded in timings}
+        self.assertFalse(succeeded['hashers'])
+        self.assertTrue(succeeded['identity filter'])
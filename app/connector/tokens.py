@@ -0,0 +1,223 @@
+import base64
+import hashlib
+import json
+import time
+import uuid
+
+import jwt
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+from connector.utils.lru import LRUCache
+
+FAMILY_CLAIM = 'family'
+PROFILE_CLAIM = 'profile'
+PROFILE_VERSION_CLAIM = 'profile_version'
+PROFILE_CLAIM_FIELDS = (
+    'username',
+    'first_name',
+    'last_name',
+    'second_last_name',
+    'email',
+    'email_verified',
+)
+
+
+def _b64url_uint(value, length=None):
+    length = length or (value.bit_length() + 7) // 8
+    data = value.to_bytes(length, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def public_jwk(public_key):
+    """
+    Returns the public JWK of an RSA or EC key, with its RFC 7638
+    thumbprint as key id
+    """
+    numbers = public_key.public_numbers()
+    if hasattr(numbers, 'n'):
+        jwk = {
+            'e': _b64url_uint(numbers.e),
+            'kty': 'RSA',
+            'n': _b64url_uint(numbers.n),
+        }
+    else:
+        size = (public_key.curve.key_size + 7) // 8
+        jwk = {
+            'crv': {256: 'P-256', 384: 'P-384', 521: 'P-521'}[
+                public_key.curve.key_size
+            ],
+            'kty': 'EC',
+            'x': _b64url_uint(numbers.x, size),
+            'y': _b64url_uint(numbers.y, size),
+        }
+    thumbprint = hashlib.sha256(
+        json.dumps(jwk, separators=(',', ':'), sort_keys=True).encode()
+    ).digest()
+    jwk['kid'] = base64.urlsafe_b64encode(thumbprint).rstrip(b'=').decode()
+    return jwk
+
+
+class CachedTokenBackend(TokenBackend):
+    """
+    TokenBackend that remembers the claims of verified tokens until they
+    expire
+
+    Services send the same access token many times, a hit skips the base64
+    decoding, JSON parsing and signature check. Entries are keyed by a
+    SHA-256 digest of the raw token, so a modified token is always a miss.
+    Revocation is checked on the decoded token by the authentication
+    classes and is never cached here.
+
+    With an asymmetric algorithm the keys are parsed once, tokens carry
+    the key id of the signing key in their `kid` header, and every key in
+    `extra_verifying_keys` is accepted too. That lets a rotation publish
+    the next key ahead of time and keep the retired one until its tokens
+    expire.
+    """
+
+    def __init__(
+        self, *args, cache_size=10000, extra_verifying_keys=(), **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.cache = LRUCache(cache_size)
+        self.key_id = None
+        self.verifying_keys = {}
+        self.jwks = []
+        if not self.algorithm.startswith('HS') and self.signing_key:
+            prepare_key = jwt.algorithms.get_default_algorithms()[
+                self.algorithm
+            ].prepare_key
+            self.signing_key = prepare_key(self.signing_key)
+            self.verifying_key = prepare_key(self.verifying_key)
+            for verifying_key in (
+                self.verifying_key,
+                *map(prepare_key, extra_verifying_keys),
+            ):
+                jwk = public_jwk(verifying_key)
+                self.verifying_keys[jwk['kid']] = verifying_key
+                self.jwks.append({**jwk, 'alg': self.algorithm, 'use': 'sig'})
+            self.key_id = self.jwks[0]['kid']
+        self.jwks_etag = '"{}"'.format(
+            hashlib.sha256(
+                json.dumps(self.jwks, sort_keys=True).encode()
+            ).hexdigest()
+        )
+
+    def get_verifying_key(self, token):
+        if not self.verifying_keys:
+            return super().get_verifying_key(token)
+        try:
+            key_id = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError:
+            key_id = None
+        if key_id is None:
+            return self.verifying_key
+        try:
+            return self.verifying_keys[key_id]
+        except KeyError:
+            raise TokenBackendError(_('Token is invalid or expired'))
+
+    def encode(self, payload):
+        if self.key_id is None:
+            return super().encode(payload)
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+        token = jwt.encode(
+            jwt_payload,
+            self.signing_key,
+            algorithm=self.algorithm,
+            headers={'kid': self.key_id},
+            json_encoder=self.json_encoder,
+        )
+        if isinstance(token, bytes):
+            return token.decode('utf-8')
+        return token
+
+    def decode(self, token, verify=True):
+        if not verify:
+            return super().decode(token, verify=False)
+
+        if isinstance(token, str):
+            token = token.encode()
+        digest = hashlib.sha256(token).digest()
+        claims = self.cache.get(digest)
+        if claims is not None and claims['exp'] > time.time():
+            return dict(claims)
+
+        claims = super().decode(token, verify=True)
+        expires_in = claims.get('exp', 0) - time.time()
+        if expires_in > 0:
+            self.cache.set(digest, claims, timeout=expires_in)
+        return dict(claims)
+
+
+token_backend = CachedTokenBackend(
+    api_settings.ALGORITHM,
+    api_settings.SIGNING_KEY,
+    api_settings.VERIFYING_KEY,
+    api_settings.AUDIENCE,
+    api_settings.ISSUER,
+    api_settings.JWK_URL,
+    api_settings.LEEWAY,
+    api_settings.JSON_ENCODER,
+    cache_size=settings.JWT_VERIFICATION_CACHE_SIZE,
+    extra_verifying_keys=settings.JWT_EXTRA_VERIFYING_KEYS,
+)
+
+
+class ProfileClaimsMixin:
+    """
+    Adds a versioned snapshot of the user profile to new tokens
+
+    With JWT_PROFILE_CLAIMS enabled the snapshot lets GET /api/user/ answer
+    from the token claims, until the user is updated again.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        if settings.JWT_PROFILE_CLAIMS:
+            token[PROFILE_CLAIM] = {
+                field: getattr(user, field) for field in PROFILE_CLAIM_FIELDS
+            }
+            token[PROFILE_VERSION_CLAIM] = user.version
+        return token
+
+
+class AccessToken(ProfileClaimsMixin, tokens.AccessToken):
+    _token_backend = token_backend
+
+
+class RefreshToken(ProfileClaimsMixin, tokens.RefreshToken):
+    """
+    Refresh token that is rotated on every use
+
+    Every login starts a new token family, the family id is copied into
+    the refresh tokens rotated from it and their access tokens, so a
+    whole login can be revoked at once.
+    """
+
+    _token_backend = token_backend
+    access_token_class = AccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[FAMILY_CLAIM] = uuid.uuid4().hex
+        return token
+
+    def rotate(self):
+        """
+        Turns this token into the next one of its family
+        """
+        self.set_jti()
+        self.set_exp()
+        self.set_iat()
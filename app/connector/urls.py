@@ -1,31 +1,66 @@
+from django.conf import settings
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 
-from . import views
+from . import async_views, views
+
+# Views with an async variant, served by it under ASGI
+interface = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path(
         'login/',
-        views.UserLoginView.as_view(),
+        interface.UserLoginView.as_view(),
         name='api_login',
     ),
+    path(
+        'token/refresh/',
+        TokenRefreshView.as_view(),
+        name='api_token_refresh',
+    ),
     path(
         'registration/',
         views.UserRegistrationView.as_view(),
         name='api_register',
     ),
+    path(
+        'availability/',
+        views.AvailabilityView.as_view(),
+        name='api_availability',
+    ),
     path(
         'send-otp/',
-        views.EmailVerificationViewSet.as_view({'post': 'send_otp'}),
+        interface.EmailVerificationViewSet.as_view({'post': 'send_otp'}),
         name='api_verification',
     ),
     path(
         'verify-otp/',
-        views.EmailVerificationViewSet.as_view({'post': 'verify_otp'}),
+        interface.EmailVerificationViewSet.as_view({'post': 'verify_otp'}),
         name='api_verification',
     ),
+    path(
+        'introspect/batch/',
+        views.TokenIntrospectionView.as_view(),
+        name='api_introspect_batch',
+    ),
+    path(
+        'users/bulk/',
+        views.BulkUserView.as_view(),
+        name='api_users_bulk',
+    ),
+    path(
+        'users/lookup/',
+        views.UserLookupView.as_view(),
+        name='api_users_lookup',
+    ),
+    path(
+        'users/export/',
+        views.UserExportView.as_view(),
+        name='api_users_export',
+    ),
     path(
         'user/',
-        views.UserViewSet.as_view(
+        interface.UserViewSet.as_view(
             {'get': 'retrieve', 'delete': 'delete', 'put': 'update'}
         ),
         name='user',
@@ -1,3 +1,6 @@
+import time
+
+
 class RedlockMock:
     def __init__(self, *args, **kwargs):
         pass
@@ -5,3 +8,155 @@ class RedlockMock:
 
 def mock_redlock(retry_count=20, retry_delay=0.2):
     return None
+
+
+class PubSubThreadMock:
+    def __init__(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+
+class PubSubMock:
+    def __init__(self, redis, **kwargs):
+        self.redis = redis
+
+    def subscribe(self, **handlers):
+        for channel, handler in handlers.items():
+            self.redis.subscribers.setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, *args, **kwargs):
+        return PubSubThreadMock()
+
+
+class RedisMock:
+    """
+    In-memory stand-in for the subset of StrictRedis the service uses
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.subscribers = {}
+
+    def _expire_stale(self, name):
+        expires_at = self.expiry.get(name)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(name, None)
+            self.expiry.pop(name, None)
+
+    def get(self, name):
+        self._expire_stale(name)
+        value = self.data.get(name)
+        if isinstance(value, str):
+            return value.encode()
+        return value
+
+    def set(self, name, value, ex=None, nx=False):
+        self._expire_stale(name)
+        if nx and name in self.data:
+            return None
+        self.data[name] = value
+        self.expiry.pop(name, None)
+        if ex is not None:
+            self.expiry[name] = time.time() + ex
+        return True
+
+    def delete(self, *names):
+        deleted = 0
+        for name in names:
+            self._expire_stale(name)
+            if self.data.pop(name, None) is not None:
+                deleted += 1
+            self.expiry.pop(name, None)
+        return deleted
+
+    def incr(self, name, amount=1):
+        self._expire_stale(name)
+        value = int(self.data.get(name, 0)) + amount
+        self.data[name] = value
+        return value
+
+    def expire(self, name, seconds):
+        if name not in self.data:
+            return False
+        if hasattr(seconds, 'total_seconds'):
+            seconds = seconds.total_seconds()
+        self.expiry[name] = time.time() + seconds
+        return True
+
+    def zadd(self, name, mapping):
+        zset = self.data.setdefault(name, {})
+        added = len(set(mapping) - set(zset))
+        zset.update(mapping)
+        return added
+
+    def zscore(self, name, member):
+        return self.data.get(name, {}).get(member)
+
+    def zcard(self, name):
+        return len(self.data.get(name, {}))
+
+    def zremrangebyscore(self, name, min, max):
+        zset = self.data.get(name, {})
+        low, high = float(min), float(max)
+        removed = [m for m, score in zset.items() if low <= score <= high]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    def zscan_iter(self, name, count=None):
+        for member, score in list(self.data.get(name, {}).items()):
+            yield member.encode(), score
+
+    def sadd(self, name, *values):
+        members = self.data.setdefault(name, set())
+        added = len(set(values) - members)
+        members.update(values)
+        return added
+
+    def smembers(self, name):
+        self._expire_stale(name)
+        return {value.encode() for value in self.data.get(name, set())}
+
+    def register_script(self, script):
+        """
+        Only the scripts of connector.throttling and the token cache of
+        connector.authentication are emulated
+        """
+
+        def sliding_window(keys, args):
+            now, window, limit, member = args
+            self.zremrangebyscore(keys[0], '-inf', now - window)
+            if self.zcard(keys[0]) < limit:
+                self.zadd(keys[0], {member: now})
+                return [1, b'0']
+            oldest = min(self.data[keys[0]].values())
+            return [0, str(oldest + window - now).encode()]
+
+        def set_unless_stale(keys, args):
+            value, version, timeout = args
+            floor = self.get(keys[1])
+            if floor is not None and int(floor) > int(version):
+                return 0
+            self.set(keys[0], value, ex=timeout)
+            return 1
+
+        from connector.authentication import SET_UNLESS_STALE_SCRIPT
+
+        if script == SET_UNLESS_STALE_SCRIPT:
+            return set_unless_stale
+        return sliding_window
+
+    def ping(self):
+        return True
+
+    def publish(self, channel, message):
+        handlers = self.subscribers.get(channel, [])
+        for handler in handlers:
+            handler({'type': 'message', 'channel': channel, 'data': message})
+        return len(handlers)
+
+    def pubsub(self, **kwargs):
+        return PubSubMock(self, **kwargs)
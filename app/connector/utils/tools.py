@@ -1,17 +1,102 @@
+import logging
+import os
+import threading
+from typing import Optional
 from urllib.parse import urlparse
 
 from django.conf import settings
+from django.utils.http import parse_etags
 from redis.client import StrictRedis
+from redis.exceptions import RedisError
 from redlock import Redlock
 
+logger = logging.getLogger(__name__)
 
-def get_redis_client() -> StrictRedis:
-    url_redis = urlparse(settings.REDIS_LOCATION)
-    redis_kwargs = (
-        {'ssl_cert_reqs': None} if url_redis.scheme == 'rediss' else {}
-    )
-    return StrictRedis.from_url(settings.REDIS_LOCATION, **redis_kwargs)
+_redis_clients = {}
+_subscriptions = {}
+_subscriptions_lock = threading.Lock()
+
+
+def get_redis_client() -> Optional[StrictRedis]:
+    """
+    Returns a client on the connection pool of REDIS_LOCATION, shared by
+    the whole process, or None when Redis is not configured
+    """
+    location = settings.REDIS_LOCATION
+    if not location:
+        return None
+    client = _redis_clients.get(location)
+    if client is None:
+        url_redis = urlparse(location)
+        redis_kwargs = (
+            {'ssl_cert_reqs': None} if url_redis.scheme == 'rediss' else {}
+        )
+        client = _redis_clients.setdefault(
+            location, StrictRedis.from_url(location, **redis_kwargs)
+        )
+    return client
+
+
+def etag_matches(header, etag, weak=True) -> bool:
+    """
+    Checks an ETag against an If-Match or If-None-Match header
+    Parameters: weak  (compare W/ tags too, as If-None-Match does)
+    """
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    if weak:
+        etags = [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+    return etag in etags
 
 
 def get_lock_client(**kwargs) -> Redlock:
     return Redlock([get_redis_client()], **kwargs)
+
+
+def subscribe(channel, handler, on_subscribe=None) -> bool:
+    """
+    Calls handler(message) from a daemon thread of this process for every
+    message published on the Redis channel
+
+    Safe to call on every use, the subscription is made once per process,
+    made again in a forked worker and made again when its thread died on
+    a connection error. on_subscribe(renewed) is called after every new
+    subscription, messages published before it were missed. renewed is
+    whether it replaces a subscription of this process that was lost.
+    Returns: whether the subscription is active
+    """
+    client = get_redis_client()
+    if client is None:
+        return False
+    key, owner = (channel, handler), (os.getpid(), client)
+    if _is_subscribed(key, owner):
+        return True
+    with _subscriptions_lock:
+        if _is_subscribed(key, owner):
+            return True
+        renewed = key in _subscriptions and _subscriptions[key][:2] == owner
+        if renewed:
+            logger.warning('Subscription to %s was lost', channel)
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{channel: handler})
+            thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except RedisError:
+            logger.exception('Failed to subscribe to %s', channel)
+            return False
+        _subscriptions[key] = (*owner, thread)
+    if on_subscribe is not None:
+        on_subscribe(renewed)
+    return True
+
+
+def _is_subscribed(key, owner):
+    subscription = _subscriptions.get(key)
+    return (
+        subscription is not None
+        and subscription[:2] == owner
+        and subscription[2].is_alive()
+    )
@@ -1,19 +1,44 @@
-from django.forms import model_to_dict
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import OpenApiResponse, extend_schema
 from rest_framework import permissions, status, viewsets
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import AccessToken
 
-from connector.operations import EmailVerificationOperations, UserOperations
+from connector import tokens
+from connector.authentication import (
+    CachedTokenAuthentication,
+    JWTRevocationAuthentication,
+)
+from connector.negotiation import IgnoreClientContentNegotiation
+from connector.operations import (
+    AvailabilityOperations,
+    BulkUserOperations,
+    EmailVerificationOperations,
+    IntrospectionOperations,
+    OTPStore,
+    ProfileVersionOperations,
+    TokenOperations,
+    UserExportOperations,
+    UserLookupOperations,
+    UserOperations,
+)
 from connector.permissions import HasAccessPermissions
+from connector.revocation import get_revocation_list
 from connector.serializers import (
+    AvailabilitySerializer,
+    BulkUserDeleteSerializer,
+    BulkUsersSerializer,
+    TokenIntrospectionSerializer,
+    UserExportSerializer,
     UserLoginSerializer,
+    UserLookupSerializer,
+    UserProjectionSerializer,
     UserRegistrationSerializer,
     UserSerializer,
 )
+from connector.tokens import FAMILY_CLAIM, PROFILE_VERSION_CLAIM, RefreshToken
+from connector.utils import tools
 
 
 @extend_schema(tags=['user login'])
@@ -23,6 +48,7 @@ class UserLoginView(APIView):
     """
 
     permission_classes = (permissions.AllowAny,)
+    throttle_scope = 'login'
 
     serializer_class = UserLoginSerializer
 
@@ -39,17 +65,230 @@ class UserLoginView(APIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        access_token = AccessToken.for_user(user)
-        token, created = Token.objects.get_or_create(user=user)
+        refresh_token = RefreshToken.for_user(user)
+        get_revocation_list().register_family(
+            user.id, refresh_token[FAMILY_CLAIM]
+        )
+        token = TokenOperations().get_or_create_token(user)
 
         # Customize token response as needed
         response_data = {
-            'Access Token': str(access_token),
-            'User Token': str(token),
+            'Access Token': str(refresh_token.access_token),
+            'Refresh Token': str(refresh_token),
+            'User Token': token,
         }
         return Response(response_data, status=status.HTTP_200_OK)
 
 
+@extend_schema(tags=['jwks'])
+class JWKSView(APIView):
+    """
+    Public keys that verify the access tokens, as a JSON Web Key Set
+    """
+
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description='Request success'),
+            304: OpenApiResponse(description='Not modified'),
+        },
+    )
+    def get(self, request):
+        etag = tokens.token_backend.jwks_etag
+        if tools.etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(
+                {'keys': tokens.token_backend.jwks}, status=status.HTTP_200_OK
+            )
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={settings.JWKS_MAX_AGE}, '
+            f'stale-while-revalidate={settings.JWKS_MAX_AGE}'
+        )
+        return response
+
+
+@extend_schema(tags=['introspection'])
+class TokenIntrospectionView(APIView):
+    """
+    Batch token introspection for internal services
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    serializer_class = TokenIntrospectionSerializer
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description='Request success'),
+            400: OpenApiResponse(description='Invalid value'),
+            403: OpenApiResponse(description='Permission Denied'),
+            500: OpenApiResponse(description='Internal server error'),
+        },
+        request=serializer_class,
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = IntrospectionOperations().introspect(
+            serializer.validated_data['tokens']
+        )
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['users bulk'])
+class BulkUserView(APIView):
+    """
+    Batch create, update and delete of users for admins
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    serializer_class = BulkUsersSerializer
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description='Request success'),
+            400: OpenApiResponse(description='Invalid value'),
+            403: OpenApiResponse(description='Permission Denied'),
+            503: OpenApiResponse(description='Password hashing is busy'),
+        },
+        request=serializer_class,
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = BulkUserOperations().create_users(
+            serializer.validated_data['users']
+        )
+        return Response(results, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description='Request success'),
+            400: OpenApiResponse(description='Invalid value'),
+            403: OpenApiResponse(description='Permission Denied'),
+            503: OpenApiResponse(description='Password hashing is busy'),
+        },
+        request=serializer_class,
+    )
+    def patch(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = BulkUserOperations().update_users(
+            serializer.validated_data['users']
+        )
+        return Response(results, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description='Request success'),
+            400: OpenApiResponse(description='Invalid value'),
+            403: OpenApiResponse(description='Permission Denied'),
+        },
+        request=BulkUserDeleteSerializer,
+    )
+    def delete(self, request):
+        serializer = BulkUserDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = BulkUserOperations().delete_users(
+            serializer.validated_data['ids']
+        )
+        return Response(results, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['users lookup'])
+class UserLookupView(APIView):
+    """
+    Resolves user ids and usernames to public profiles for internal services
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    serializer_class = UserLookupSerializer
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description='Request success'),
+            400: OpenApiResponse(description='Invalid value'),
+            403: OpenApiResponse(description='Permission Denied'),
+        },
+        parameters=[serializer_class],
+    )
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        users = UserLookupOperations().lookup(**serializer.validated_data)
+        return Response({'users': users}, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['users export'])
+class UserExportView(APIView):
+    """
+    Streams every user as NDJSON or CSV for admins
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+    # The body is not rendered, Accept names the export media type
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    serializer_class = UserExportSerializer
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description='Request success'),
+            400: OpenApiResponse(description='Invalid value'),
+            403: OpenApiResponse(description='Permission Denied'),
+        },
+        parameters=[serializer_class],
+    )
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        output = serializer.validated_data['output']
+        operations = UserExportOperations()
+        response = StreamingHttpResponse(
+            operations.export(**serializer.validated_data),
+            content_type=operations.content_types[output],
+        )
+        response[
+            'Content-Disposition'
+        ] = f'attachment; filename="users.{output}"'
+        return response
+
+
+@extend_schema(tags=['availability'])
+class AvailabilityView(APIView):
+    """
+    Tells whether a username or email is still free
+    """
+
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)
+    throttle_scope = 'availability'
+
+    serializer_class = AvailabilitySerializer
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description='Request success'),
+            400: OpenApiResponse(description='Invalid value'),
+            429: OpenApiResponse(description='Too many requests'),
+        },
+        parameters=[serializer_class],
+    )
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        results = AvailabilityOperations().check_availability(
+            **serializer.validated_data
+        )
+        return Response(results, status=status.HTTP_200_OK)
+
+
 @extend_schema(tags=['user register'])
 class UserRegistrationView(APIView):
     """
@@ -57,6 +296,7 @@ class UserRegistrationView(APIView):
     """
 
     permission_classes = (permissions.AllowAny,)
+    throttle_scope = 'registration'
 
     serializer_class = UserRegistrationSerializer
 
@@ -85,16 +325,28 @@ class UserViewSet(viewsets.ViewSet):
     User view
     """
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (
+        CachedTokenAuthentication,
+        JWTRevocationAuthentication,
+    )
     permission_classes = (permissions.IsAuthenticated, HasAccessPermissions)
 
     serializer_class = UserSerializer
 
+    def profile_response(self, data, etag, status_code=status.HTTP_200_OK):
+        response = Response(data, status=status_code)
+        response['ETag'] = etag
+        # Clients may keep the profile, but must revalidate it
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
     @extend_schema(
         responses={
             200: OpenApiResponse(description='Request success'),
             400: OpenApiResponse(description='Invalid value'),
             403: OpenApiResponse(description='Permission Denied'),
+            409: OpenApiResponse(description='Concurrent update'),
+            412: OpenApiResponse(description='Precondition failed'),
             500: OpenApiResponse(description='Internal server error'),
         },
         request=serializer_class,
@@ -103,23 +355,42 @@ class UserViewSet(viewsets.ViewSet):
         """
         Updates user information
         """
-        user_id = request.user.id
-        user_instance = UserOperations().get_user_instance(user_id)
+        user_operations = UserOperations(request)
+        user_instance = user_operations.get_user_instance(request.user.id)
+
+        if_match = request.headers.get('If-Match')
+        if if_match:
+            # Lost-update protection, the client must have seen the version
+            # being updated. The update is guarded by that version, the
+            # Redis mirror may lag behind a concurrent commit.
+            etag = ProfileVersionOperations.etag(
+                user_instance.pk, user_instance.version
+            )
+            if not tools.etag_matches(if_match, etag, weak=False):
+                return Response(
+                    {'error': 'User was modified, fetch it again'},
+                    status=status.HTTP_412_PRECONDITION_FAILED,
+                )
 
-        UserOperations().update_user(
+        user_operations.update_user(
             user_data=request.data,
             context={'request': request},
             user_instance=user_instance,
         )
 
-        return Response(
+        response = Response(
             data='User information updated successfully',
             status=status.HTTP_201_CREATED,
         )
+        response['ETag'] = ProfileVersionOperations.etag(
+            user_instance.pk, user_instance.version
+        )
+        return response
 
     @extend_schema(
         responses={
             200: OpenApiResponse(description='Request success'),
+            304: OpenApiResponse(description='Not modified'),
             400: OpenApiResponse(description='Invalid value'),
             403: OpenApiResponse(description='Permission Denied'),
             500: OpenApiResponse(description='Internal server error'),
@@ -128,11 +399,33 @@ class UserViewSet(viewsets.ViewSet):
     )
     def retrieve(self, request):
         user_id = request.user.id
-        user_instance = UserOperations().get_user_instance(user_id)
-
-        return Response(
-            model_to_dict(user_instance),
-            status=status.HTTP_200_OK,
+        profile_versions = ProfileVersionOperations()
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            # Polling clients get a bodyless answer while nothing changed
+            etag = profile_versions.get_etag(user_id)
+            if etag is not None and tools.etag_matches(if_none_match, etag):
+                return self.profile_response(
+                    None, etag, status.HTTP_304_NOT_MODIFIED
+                )
+
+        if settings.JWT_PROFILE_CLAIMS:
+            # Answer from an up to date snapshot in the access token
+            profile = profile_versions.get_profile_from_token(request.auth)
+            if profile is not None:
+                return self.profile_response(
+                    profile,
+                    profile_versions.etag(
+                        user_id, request.auth[PROFILE_VERSION_CLAIM]
+                    ),
+                )
+
+        user_instance = UserOperations(request).get_user_instance(user_id)
+
+        return self.profile_response(
+            UserProjectionSerializer.to_representation(user_instance),
+            profile_versions.etag(user_id, user_instance.version),
         )
 
     @extend_schema(
@@ -147,11 +440,11 @@ class UserViewSet(viewsets.ViewSet):
         """
         Deletes User on given id
         """
-        user_id = request.user.id
-        username = request.user.username
-        user_instance = UserOperations().get_user_instance(user_id)
+        user_operations = UserOperations(request)
+        user_instance = user_operations.get_user_instance(request.user.id)
+        username = user_instance.username
 
-        UserOperations().delete_user_record(user_instance)
+        user_operations.delete_user_record(user_instance)
 
         return Response(
             {f'User  {username} was successfully deleted'},
@@ -161,42 +454,48 @@ class UserViewSet(viewsets.ViewSet):
 
 @extend_schema(tags=['email verification'])
 class EmailVerificationViewSet(viewsets.ViewSet):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated, HasAccessPermissions)
 
+    @property
+    def throttle_scope(self):
+        # Only sending mail is throttled
+        return 'otp' if self.action == 'send_otp' else None
+
     @extend_schema(
         responses={
             200: OpenApiResponse(description='Request success'),
             400: OpenApiResponse(description='Invalid value'),
             403: OpenApiResponse(description='Permission Denied'),
             500: OpenApiResponse(description='Internal server error'),
+            503: OpenApiResponse(description='Verification unavailable'),
         },
     )
     def send_otp(self, request):
-        user_id = request.user.id
-        email = UserOperations().get_user_instance(user_id).email
+        email = (
+            UserOperations(request).get_user_instance(request.user.id).email
+        )
         if not email:
             return Response(
                 {'error': 'Email not provided'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        otp = EmailVerificationOperations().send_otp_to_email(email)
-
-        # Storing the OTP in session for verification
-        request.session['otp'] = otp
-        request.session['email'] = email
+        operations = EmailVerificationOperations()
+        otp = operations.generate_otp()
+        # Stored first, a failure must not mail an unusable code
+        OTPStore().store(request.user.id, otp)
+        operations.send_otp_to_email(email, otp)
 
         response = {'message': f'OTP send to your email {email} successfully'}
 
         return Response(response, status.HTTP_200_OK)
 
     def verify_otp(self, request):
-        user_id = request.user.id
-        user_instance = UserOperations().get_user_instance(user_id)
+        user_operations = UserOperations(request)
+        user_instance = user_operations.get_user_instance(request.user.id)
 
         submitted_otp = request.data.get('otp')
-        stored_otp = request.session.get('otp')
 
         if not submitted_otp:
             return Response(
@@ -204,13 +503,15 @@ class EmailVerificationViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if submitted_otp != stored_otp:
+        if not OTPStore().verify(request.user.id, str(submitted_otp)):
             return Response(
                 {'error': 'Invalid OTP'}, status=status.HTTP_400_BAD_REQUEST
             )
 
         # update user information
         user_information = {'email_verified': True}
-        UserOperations().update_user(user_information, user_instance, request)
+        user_operations.update_user(
+            user_information, user_instance, {'request': request}
+        )
 
         return Response({'message': 'Email verification successful'})
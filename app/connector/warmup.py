@@ -0,0 +1,87 @@
+import logging
+import time
+
+from django.contrib.auth import hashers
+from django.db import connections
+from django.urls import get_resolver
+
+from connector import hashing
+from connector.identities import get_identity_filter
+from connector.revocation import get_revocation_list
+from connector.utils import tools
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_database():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def _warm_redis():
+    client = tools.get_redis_client()
+    if client is not None:
+        client.ping()
+
+
+def _warm_urls():
+    # Builds the reverse lookups of every pattern, resolving does the rest
+    get_resolver().reverse_dict
+
+
+def _warm_hashers():
+    hashers.get_hashers()
+    hashers.get_hasher('default')
+
+
+def _warm_hashing_pool():
+    # Spawns the pool processes, which set up Django before the first job
+    hashing.get_executor().start()
+
+
+def _warm_identity_filter():
+    identity_filter = get_identity_filter()
+    identity_filter.is_shared()
+    # Only new users are read when the filter came from the master, an old
+    # one is rebuilt in the background
+    identity_filter.build()
+
+
+def _warm_revocation_list():
+    get_revocation_list().rebuild()
+
+
+WARM_UP_STEPS = (
+    ('database', _warm_database),
+    ('redis', _warm_redis),
+    ('urls', _warm_urls),
+    ('hashers', _warm_hashers),
+    ('hashing pool', _warm_hashing_pool),
+    ('identity filter', _warm_identity_filter),
+    ('revocation list', _warm_revocation_list),
+)
+
+
+def warm_up():
+    """
+    Pays for the first-use costs of a worker before it serves requests
+
+    Opens the database and Redis connections, builds the URL resolver,
+    loads the password hashers, starts the hashing pool and builds the
+    revocation filter and the identity filter, or catches up the one
+    inherited from the master.
+    A failed step is logged and left to the first request.
+    Returns: (step name, seconds, whether it succeeded) of every step
+    """
+    timings = []
+    for name, step in WARM_UP_STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Failed to warm up the %s', name)
+            succeeded = False
+        else:
+            succeeded = True
+        timings.append((name, time.perf_counter() - start, succeeded))
+    return timings
@@ -0,0 +1,127 @@
+"""
+Gunicorn production profile, loaded from the working directory:
+
+    gunicorn uservice.wsgi
+
+The application is imported once by the master and shared by the forked
+workers, with the identity filter it builds. Each worker warms up before
+it accepts connections and logs how long after the fork and after the
+master started it served its first request.
+"""
+import multiprocessing
+import os
+import time
+
+started_at = time.monotonic()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8888')
+
+# One process per core, threads overlap the database and Redis waits
+workers = int(os.environ.get('GUNICORN_WORKERS', 0)) or (
+    multiprocessing.cpu_count()
+)
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_class = 'gthread'
+
+# Every worker has its own hashing pool, together they use every core.
+# Empty and 0 mean unset, settings would give each pool every core
+if not int(os.environ.get('PASSWORD_HASHING_WORKERS') or 0):
+    os.environ['PASSWORD_HASHING_WORKERS'] = str(
+        max(1, multiprocessing.cpu_count() // workers)
+    )
+
+# Recycled workers finish their requests first, the jitter keeps them
+# from restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 50))
+graceful_timeout = 30
+timeout = 30
+
+# Code reloading needs the workers to import the application themselves
+reload = os.environ.get('GUNICORN_RELOAD') == 'True'
+preload_app = not reload
+
+
+def when_ready(server):
+    if preload_app:
+        build_identity_filter(server)
+    server.log.info(
+        'Master ready in %.3fs, application %s',
+        time.monotonic() - started_at,
+        'preloaded' if preload_app else 'loaded by the workers',
+    )
+
+
+def pre_fork(server, worker):
+    if not preload_app:
+        return
+    # Only the users created since are read. A table scan would keep the
+    # master from reaping and respawning workers, an old filter is
+    # rebuilt by the workers in the background
+    build_identity_filter(server, rebuild=False)
+    # Workers must not share the sockets of the master
+    from django.db import connections
+
+    connections.close_all()
+
+
+def build_identity_filter(server, rebuild=True):
+    """
+    Builds the identity filter in the master, or only adds the users
+    created since, the workers inherit it and subscribe to its broadcasts
+    """
+    from connector.identities import get_identity_filter
+
+    identity_filter = get_identity_filter()
+    try:
+        if rebuild:
+            identity_filter.build()
+        elif identity_filter.bloom is not None:
+            identity_filter.sync()
+    except Exception:
+        server.log.exception('Failed to build the identity filter')
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+    worker.first_request = True
+
+
+def post_worker_init(worker):
+    from django.db import connections
+
+    from connector.warmup import warm_up
+
+    start = time.monotonic()
+    timings = warm_up()
+    # Requests run on the worker threads, with their own connections
+    connections.close_all()
+    worker.log.info(
+        'Worker %s warmed up in %.3fs: %s',
+        worker.pid,
+        time.monotonic() - start,
+        ', '.join(
+            f'{name} {seconds:.3f}s' + ('' if succeeded else ' (failed)')
+            for name, seconds, succeeded in timings
+        ),
+    )
+
+
+def pre_request(worker, req):
+    if worker.first_request is True:
+        worker.first_request = time.monotonic()
+
+
+def post_request(worker, req, environ, resp):
+    if isinstance(worker.first_request, bool):
+        return
+    received_at, worker.first_request = worker.first_request, False
+    now = time.monotonic()
+    worker.log.info(
+        'Worker %s served its first request in %.3fs, %.3fs after fork, '
+        '%.3fs after start',
+        worker.pid,
+        now - received_at,
+        now - worker.forked_at,
+        now - started_at,
+    )
@@ -0,0 +1,21 @@
+"""
+ASGI config for uservice project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g.:
+
+    uvicorn uservice.asgi:application --host 0.0.0.0 --port 8888
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uservice.settings')
+# Routes the I/O-bound endpoints to the async views
+os.environ.setdefault('SERVICE_INTERFACE', 'asgi')
+
+application = get_asgi_application()
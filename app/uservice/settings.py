@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import datetime
+import json
 import os
 import sys
 from datetime import timedelta
@@ -64,16 +65,43 @@ MIDDLEWARE = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+    'DEFAULT_RENDERER_CLASSES': ('connector.renderers.ORJSONRenderer',),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
+        'connector.authentication.CachedTokenAuthentication',
+        'connector.authentication.JWTRevocationAuthentication',
     ],
+    # Views opt in with a throttle_scope, see connector.throttling
+    'DEFAULT_THROTTLE_CLASSES': [
+        'connector.throttling.IPThrottle',
+        'connector.throttling.IdentityThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('THROTTLE_LOGIN_IP', '30/min'),
+        'login_identity': os.environ.get('THROTTLE_LOGIN_IDENTITY', '5/min'),
+        'registration_ip': os.environ.get(
+            'THROTTLE_REGISTRATION_IP', '30/hour'
+        ),
+        'registration_identity': os.environ.get(
+            'THROTTLE_REGISTRATION_IDENTITY', '3/hour'
+        ),
+        'otp_ip': os.environ.get('THROTTLE_OTP_IP', '20/hour'),
+        'otp_identity': os.environ.get('THROTTLE_OTP_IDENTITY', '3/hour'),
+        'availability_ip': os.environ.get(
+            'THROTTLE_AVAILABILITY_IP', '120/min'
+        ),
+    },
+    # Proxies in front of the service, client addresses are read from
+    # X-Forwarded-For past them
+    'NUM_PROXIES': (
+        int(os.environ['THROTTLE_NUM_PROXIES'])
+        if os.environ.get('THROTTLE_NUM_PROXIES')
+        else None
+    ),
 }
 
 ROOT_URLCONF = 'uservice.urls'
@@ -97,6 +125,12 @@ TEMPLATES = [
 AUTH_USER_MODEL = 'connector.UserModel'
 
 WSGI_APPLICATION = 'uservice.wsgi.application'
+ASGI_APPLICATION = 'uservice.asgi.application'
+
+# Under uservice.asgi the login, email verification and user endpoints are
+# async views, their blocking work runs on ASYNC_VIEW_THREADS threads
+ASYNC_VIEWS = os.environ.get('SERVICE_INTERFACE', 'wsgi') == 'asgi'
+ASYNC_VIEW_THREADS = int(os.environ.get('ASYNC_VIEW_THREADS', 32))
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -112,6 +146,21 @@ DATABASES = {
     }
 }
 
+# Redis
+REDIS_LOCATION = os.environ.get('REDIS_LOCATION')
+
+CACHES = {
+    'default': (
+        {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_LOCATION,
+            'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+        }
+        if REDIS_LOCATION
+        else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    )
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -130,6 +179,38 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+AUTHENTICATION_BACKENDS = ['connector.backends.UsernameOrEmailBackend']
+
+PASSWORD_HASHERS = [
+    'connector.hashers.CalibratedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'connector.hashers.CalibratedArgon2PasswordHasher',
+    'connector.hashers.CalibratedBCryptSHA256PasswordHasher',
+]
+
+# Work factors tuned for this host by `manage.py calibrate_hashers`
+PASSWORD_HASHER_COSTS_FILE = os.environ.get(
+    'PASSWORD_HASHER_COSTS_FILE', os.path.join(BASE_DIR, 'hasher_costs.json')
+)
+try:
+    with open(PASSWORD_HASHER_COSTS_FILE) as costs_file:
+        PASSWORD_HASHER_COSTS = json.load(costs_file)
+except FileNotFoundError:
+    PASSWORD_HASHER_COSTS = {}
+
+# Outdated password hashes are upgraded after login, off the request thread
+PASSWORD_REHASH_IN_BACKGROUND = True
+
+# Password hashing runs on a process pool so it does not block request threads
+PASSWORD_HASHING_EXECUTOR = {
+    'ENABLED': os.environ.get('PASSWORD_HASHING_POOL', 'True') == 'True',
+    'MAX_WORKERS': int(os.environ.get('PASSWORD_HASHING_WORKERS', 0))
+    or os.cpu_count(),
+    'MAX_QUEUE_SIZE': int(os.environ.get('PASSWORD_HASHING_QUEUE_SIZE', 64)),
+    'TIMEOUT': float(os.environ.get('PASSWORD_HASHING_TIMEOUT', 5)),
+    'START_METHOD': 'spawn',
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -154,15 +235,132 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Email verification
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_USER_HOST = os.environ.get('EMAIL_USER_HOST')
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 10))
+
+# Email verification codes live in Redis for OTP_TTL seconds and accept
+# OTP_MAX_ATTEMPTS checks
+OTP_TTL = int(os.environ.get('OTP_TTL', 300))
+OTP_MAX_ATTEMPTS = int(os.environ.get('OTP_MAX_ATTEMPTS', 5))
+
+# Emails are written to an outbox table and sent by run_mail_worker
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50)),
+    'MAX_ATTEMPTS': int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)),
+    'BACKOFF': int(os.environ.get('EMAIL_OUTBOX_BACKOFF', 30)),
+    'LEASE': 300,
+    'INTERVAL': float(os.environ.get('EMAIL_OUTBOX_INTERVAL', 1)),
+}
 
 # JWT Authentication
+# HS* algorithms sign with the shared JWT_SECRET_KEY. RS*/ES* sign with the
+# private key in JWT_SECRET_KEY and publish JWT_PUBLIC_KEY on the JWKS
+# endpoint. PEM keys may use literal \n for line breaks.
+JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS512')
+
+
+def _pem_keys(value):
+    """
+    Splits an environment value into PEM keys
+    """
+    value = (value or '').replace('\\n', '\n')
+    marker = '-----BEGIN '
+    return [marker + key.strip() for key in value.split(marker)[1:]]
+
+
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': datetime.timedelta(days=15),
-    'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=15),
-    'ALGORITHM': 'HS512',
-    'SIGNING_KEY': os.environ.get('JWT_SECRET_KEY'),
+    # Access tokens are short-lived, refresh tokens rotate on every use and
+    # both can be revoked, see connector.revocation
+    'ACCESS_TOKEN_LIFETIME': datetime.timedelta(
+        minutes=int(os.environ.get('JWT_ACCESS_TOKEN_LIFETIME_MINUTES', 15))
+    ),
+    'REFRESH_TOKEN_LIFETIME': datetime.timedelta(
+        days=int(os.environ.get('JWT_REFRESH_TOKEN_LIFETIME_DAYS', 15))
+    ),
+    'ROTATE_REFRESH_TOKENS': True,
+    'TOKEN_REFRESH_SERIALIZER': (
+        'connector.serializers.TokenRefreshSerializer'
+    ),
+    'ALGORITHM': JWT_ALGORITHM,
+    'SIGNING_KEY': (
+        os.environ.get('JWT_SECRET_KEY')
+        if JWT_ALGORITHM.startswith('HS')
+        else next(iter(_pem_keys(os.environ.get('JWT_SECRET_KEY'))), None)
+    ),
+    'VERIFYING_KEY': next(
+        iter(_pem_keys(os.environ.get('JWT_PUBLIC_KEY'))), ''
+    ),
+    'AUTH_TOKEN_CLASSES': ('connector.tokens.AccessToken',),
     # Other JWT settings...
 }
+
+# Public keys accepted besides JWT_PUBLIC_KEY during a key rotation: the
+# next key ahead of the switch, and the retired one until its tokens expire
+JWT_EXTRA_VERIFYING_KEYS = _pem_keys(
+    os.environ.get('JWT_EXTRA_VERIFYING_KEYS')
+)
+
+# Per-worker Bloom filter of the usernames and emails in use, it answers
+# most availability checks and unknown-user logins without the database.
+# Logins only trust it with Redis, which broadcasts users saved elsewhere.
+IDENTITY_FILTER = {
+    'ERROR_RATE': 0.01,
+    'SYNC_INTERVAL': 5,
+    'REBUILD_INTERVAL': 600,
+    'LOGIN_SHORT_CIRCUIT': True,
+}
+
+# Revoked token ids live in Redis, each worker checks them against a Bloom
+# filter rebuilt every REBUILD_INTERVAL seconds
+TOKEN_REVOCATION = {
+    'BLOOM_CAPACITY': 100000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'REBUILD_INTERVAL': 60,
+    # When Redis fails refresh tokens are rejected, access tokens are
+    # accepted unchecked and logged unless this is False
+    'ACCESS_FAIL_OPEN': (
+        os.environ.get('TOKEN_REVOCATION_ACCESS_FAIL_OPEN', 'True') == 'True'
+    ),
+}
+
+# Most users accepted by one bulk create, update or delete request, and
+# the rows written per query
+BULK_USERS_MAX_SIZE = 5000
+BULK_USERS_CHUNK_SIZE = 1000
+
+# Deleted users are removed by the purge worker after the grace period,
+# in batches of USERS_PURGE_BATCH_SIZE, polling every interval when idle
+USERS_PURGE_BATCH_SIZE = 100
+USERS_PURGE_GRACE_PERIOD = 0
+USERS_PURGE_INTERVAL = 30
+
+# Most ids and usernames resolved by one user lookup request
+USERS_LOOKUP_MAX_SIZE = 500
+
+# Users read per keyset query of the user export
+USERS_EXPORT_CHUNK_SIZE = 2000
+
+# Most tokens accepted by one batch introspection request
+INTROSPECTION_BATCH_MAX_SIZE = 100
+
+# Seconds consumers may cache the JWKS document
+JWKS_MAX_AGE = 60 * 60
+
+# Verified access tokens kept in process until they expire
+JWT_VERIFICATION_CACHE_SIZE = 10000
+
+# Embed a versioned profile snapshot in access tokens, so GET /api/user/
+# can answer from the token claims
+JWT_PROFILE_CLAIMS = os.environ.get('JWT_PROFILE_CLAIMS', 'False') == 'True'
+# Seconds an issued DRF token key stays cached for repeat logins
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 60
+
+# Users behind DRF tokens, cached in process and in Redis for authentication
+AUTH_TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'LOCAL_TIMEOUT': 5,
+    'REDIS_TIMEOUT': 5 * 60,
+}
+
 # Django REST Framework settings
 REST_USE_JWT = True  # Use JWT for authentication
 
@@ -191,15 +389,27 @@ if TEST:
 
     # JWT Authentication
     SIMPLE_JWT = {
-        'ACCESS_TOKEN_LIFETIME': datetime.timedelta(days=15),
+        'ACCESS_TOKEN_LIFETIME': datetime.timedelta(minutes=15),
         'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=15),
+        'ROTATE_REFRESH_TOKENS': True,
+        'TOKEN_REFRESH_SERIALIZER': (
+            'connector.serializers.TokenRefreshSerializer'
+        ),
         'ALGORITHM': 'HS512',
         'SIGNING_KEY': 'secret',
+        'VERIFYING_KEY': '',
+        'AUTH_TOKEN_CLASSES': ('connector.tokens.AccessToken',),
         # Other JWT settings...
     }
 
+    JWT_EXTRA_VERIFYING_KEYS = []
+
     EMAIL_USER_HOST = 'test'
 
+    PASSWORD_HASHING_EXECUTOR = {'ENABLED': False}
+    PASSWORD_HASHER_COSTS = {}
+    PASSWORD_REHASH_IN_BACKGROUND = False
+
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
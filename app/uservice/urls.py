@@ -23,8 +23,11 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from connector.views import JWKSView
+
 urlpatterns = [
     path('api/', include('connector.urls')),
+    path('.well-known/jwks.json', JWKSView.as_view(), name='jwks'),
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path(
         'swagger/',